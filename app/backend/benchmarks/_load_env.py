@@ -0,0 +1,15 @@
+"""Environment for benchmarks.load, imported before anything from src.
+
+The app reads its configuration at import time, so this has to run first:
+it points the app at a scratch database unless the caller set one.
+"""
+import os
+import tempfile
+
+_scratch = tempfile.mkdtemp(prefix="bench-")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{_scratch}/load.db")
+os.environ.setdefault("STORAGE_DIR", os.path.join(_scratch, "storage"))
+os.environ.setdefault("JWT_SECRET", "bench-secret")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+# All traffic comes from one address; the per-IP auth limit would turn the login scenario into 429s
+os.environ.setdefault("AUTH_IP_LIMIT", "1000000")
@@ -0,0 +1,123 @@
+"""Statement count and latency of the timeline feed as `limit` and page depth grow.
+
+    uv run python -m benchmarks.feed_queries --posts 1000
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.future import select
+from sqlmodel import SQLModel
+
+from src.feed import feed_order, fetch_feed
+from src.models import ScheduleEvent, TimelinePost, TimelineReaction, User
+from src.reactions import rebuild_reaction_counters
+
+REACTION_TYPES = ["point", "thumbsUp", "hand", "pinch"]
+
+
+async def seed(session_maker, post_count: int, user_count: int):
+    async with session_maker() as session:
+        users = [
+            User(email=f"bench{i}@example.com", hashed_password="x", username=f"bench{i}")
+            for i in range(user_count)
+        ]
+        session.add_all(users)
+        base = datetime(2025, 1, 1)
+        for i in range(post_count):
+            author = users[i % user_count]
+            event_row = ScheduleEvent(
+                user_id=author.id, title=f"event {i}", category="Work",
+                start_date=base, end_date=base,
+            )
+            post = TimelinePost(
+                user_id=author.id, event_id=event_row.id, content=f"post {i}",
+                created_at=base + timedelta(minutes=i),
+            )
+            session.add_all([event_row, post])
+            for j, reactor in enumerate(users[: i % user_count]):
+                session.add(TimelineReaction(
+                    user_id=reactor.id, post_id=post.id,
+                    reaction_type=REACTION_TYPES[j % len(REACTION_TYPES)],
+                ))
+        await session.commit()
+        await rebuild_reaction_counters(session)
+        return users[0].id
+
+
+# The pre-engine implementation: one page query plus two queries per post.
+async def legacy_feed(session, viewer_id, limit: int):
+    result = await session.execute(
+        select(TimelinePost, User)
+        .join(User, TimelinePost.user_id == User.id)
+        .order_by(TimelinePost.created_at.desc())
+        .limit(limit)
+    )
+    for post, _author in result.all():
+        await session.execute(select(func.count(TimelineReaction.id)).where(TimelineReaction.post_id == post.id))
+        await session.execute(select(TimelineReaction.reaction_type).where(
+            TimelineReaction.post_id == post.id, TimelineReaction.user_id == viewer_id
+        ))
+
+
+async def run(post_count: int, user_count: int, repeat: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp}/bench.db")
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+        viewer_id = await seed(session_maker, post_count, user_count)
+
+        statements = 0
+
+        def count(*_args):
+            nonlocal statements
+            statements += 1
+
+        event.listen(engine.sync_engine, "before_cursor_execute", count)
+
+        print(f"{'limit':>6} {'mode':>7} {'queries':>8} {'ms/page':>8}")
+        for limit in (10, 20, 50, 100):
+            for mode, page in (("legacy", legacy_feed), ("engine", fetch_feed)):
+                statements = 0
+                started = time.perf_counter()
+                for _ in range(repeat):
+                    async with session_maker() as session:
+                        await page(session, viewer_id, limit=limit)
+                elapsed = (time.perf_counter() - started) / repeat * 1000
+                print(f"{limit:>6} {mode:>7} {statements // repeat:>8} {elapsed:>8.2f}")
+
+        print(f"\n{'depth':>6} {'offset ms':>10} {'cursor ms':>10}")
+        for depth in (0, post_count // 4, post_count // 2, post_count - 20):
+            async with session_maker() as session:
+                boundary = (await session.execute(
+                    select(TimelinePost.created_at, TimelinePost.id)
+                    .order_by(*feed_order()).offset(max(depth - 1, 0)).limit(1)
+                )).one()
+            timings = []
+            for kwargs in ({"offset": depth}, {"cursor": tuple(boundary)} if depth else {}):
+                started = time.perf_counter()
+                for _ in range(repeat):
+                    async with session_maker() as session:
+                        await fetch_feed(session, viewer_id, limit=20, **kwargs)
+                timings.append((time.perf_counter() - started) / repeat * 1000)
+            print(f"{depth:>6} {timings[0]:>10.2f} {timings[1]:>10.2f}")
+
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, default=1000)
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(run(args.posts, args.users, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
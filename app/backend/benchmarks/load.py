@@ -0,0 +1,311 @@
+"""Throughput, latency and SQL statements per request of the main API endpoints.
+
+    uv run python -m benchmarks.load                      # in-process ASGI, compare with baseline
+    uv run python -m benchmarks.load --transport uvicorn  # through a local uvicorn process
+    uv run python -m benchmarks.load --save-baseline      # record the current numbers
+
+Exits with status 1 when a scenario regresses against the stored baseline.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import socket
+import statistics
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import httpx
+from fastapi_users.password import PasswordHelper
+from sqlalchemy import insert
+
+# Before anything from src: sets up the environment the app reads at import time
+from benchmarks import _load_env  # noqa: F401
+from src.auth import get_jwt_strategy
+from src.db import async_session_maker, create_db_and_tables, engine
+from src.migrations import run_migrations
+from src.models import ScheduleEvent, TimelinePost, TimelineReaction, User
+from src.reactions import rebuild_reaction_counters
+
+REACTION_TYPES = ["point", "thumbsUp", "hand", "pinch"]
+PASSWORD = "bench-password"
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# name -> (method, route template as reported by /metrics, share of --requests)
+SCENARIOS = {
+    "feed": ("GET", "/v1/timeline/posts", 1.0),
+    "events": ("GET", "/v1/events/", 1.0),
+    "react": ("POST", "/v1/timeline/posts/{post_id}/reactions", 1.0),
+    # Password hashing dominates; fewer requests give the same picture
+    "login": ("POST", "/v1/auth/jwt/login", 0.25),
+}
+
+
+def percentile(samples, q):
+    if len(samples) < 2:
+        return samples[0] if samples else float("nan")
+    return statistics.quantiles(samples, n=100, method="inclusive")[q - 1]
+
+
+async def _insert_chunked(conn, model, rows, size: int = 5000):
+    for start in range(0, len(rows), size):
+        await conn.execute(insert(model), rows[start:start + size])
+
+
+# Bulk-loads the dataset with multi-row INSERTs; returns user and post ids
+async def seed(users: int, events: int, posts: int, reactions: int, rng: random.Random):
+    await create_db_and_tables()
+    await run_migrations()
+
+    # One real hash shared by everyone keeps seeding fast while login still verifies it
+    hashed = PasswordHelper().hash(PASSWORD)
+    base = datetime(2025, 1, 1)
+    user_rows = [
+        User(email=f"bench{i}@example.com", username=f"bench{i}", hashed_password=hashed,
+             is_verified=True, created_at=base).model_dump()
+        for i in range(users)
+    ]
+    event_rows = []
+    for i in range(max(events, posts)):
+        start = base + timedelta(hours=i)
+        event_rows.append(ScheduleEvent(
+            user_id=user_rows[i % users]["id"], title=f"event {i}", category="Work",
+            start_date=start, end_date=start + timedelta(hours=1), is_ai_generated=i < posts,
+        ).model_dump())
+    post_rows = [
+        TimelinePost(
+            user_id=event_rows[i]["user_id"], event_id=event_rows[i]["id"], content=f"post {i}",
+            created_at=base + timedelta(minutes=i),
+        ).model_dump()
+        for i in range(posts)
+    ]
+    pairs = set()
+    while len(pairs) < min(reactions, users * posts):
+        pairs.add((rng.randrange(posts), rng.randrange(users)))
+    reaction_rows = [
+        TimelineReaction(
+            post_id=post_rows[p]["id"], user_id=user_rows[u]["id"], reaction_type=rng.choice(REACTION_TYPES),
+        ).model_dump()
+        for p, u in pairs
+    ]
+
+    async with engine.begin() as conn:
+        await _insert_chunked(conn, User, user_rows)
+        await _insert_chunked(conn, ScheduleEvent, event_rows)
+        await _insert_chunked(conn, TimelinePost, post_rows)
+        await _insert_chunked(conn, TimelineReaction, reaction_rows)
+    async with async_session_maker() as session:
+        await rebuild_reaction_counters(session)
+
+    return [row["id"] for row in user_rows], [row["id"] for row in post_rows]
+
+
+async def issue_tokens(user_ids, count: int):
+    strategy = get_jwt_strategy()
+    tokens = []
+    for user_id in user_ids[:count]:
+        user = User(id=user_id, email="", username="", hashed_password="", created_at=datetime(2025, 1, 1))
+        tokens.append(await strategy.write_token(user))
+    return tokens
+
+
+def build_request(name: str, rng: random.Random, tokens, post_ids, user_count: int):
+    if name == "login":
+        i = rng.randrange(user_count)
+        return "POST", "/v1/auth/jwt/login", {"data": {"username": f"bench{i}@example.com", "password": PASSWORD}}
+    headers = {"Authorization": f"Bearer {rng.choice(tokens)}"}
+    if name == "feed":
+        return "GET", "/v1/timeline/posts?limit=20", {"headers": headers}
+    if name == "events":
+        return "GET", "/v1/events/", {"headers": headers}
+    if name == "react":
+        post_id = rng.choice(post_ids)
+        path = f"/v1/timeline/posts/{post_id}/reactions?reaction_type={rng.choice(REACTION_TYPES)}"
+        return "POST", path, {"headers": headers}
+    raise ValueError(name)
+
+
+_SAMPLE = re.compile(r'^(\w+)\{method="([^"]*)",route="([^"]*)"\} (\S+)$')
+
+
+async def statement_totals(client: httpx.AsyncClient):
+    # (method, route) -> [statements, requests] from the app's own /metrics
+    totals = defaultdict(lambda: [0.0, 0.0])
+    for line in (await client.get("/metrics")).text.splitlines():
+        match = _SAMPLE.match(line)
+        if match and match.group(1).startswith("http_request_db_statements_"):
+            key = (match.group(2), match.group(3))
+            totals[key][0 if match.group(1).endswith("_sum") else 1] += float(match.group(4))
+    return totals
+
+
+async def run_scenario(client, name: str, requests: int, concurrency: int, rng, tokens, post_ids, user_count):
+    method, route, _ = SCENARIOS[name]
+    before = (await statement_totals(client))[(method, route)]
+    plan = [build_request(name, rng, tokens, post_ids, user_count) for _ in range(requests)]
+    latencies = []
+    errors = 0
+
+    async def worker(queue: asyncio.Queue):
+        nonlocal errors
+        while not queue.empty():
+            req_method, path, kwargs = queue.get_nowait()
+            started = time.perf_counter()
+            res = await client.request(req_method, path, **kwargs)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if res.status_code >= 400:
+                errors += 1
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for item in plan:
+        queue.put_nowait(item)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(queue) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    after = (await statement_totals(client))[(method, route)]
+    counted = after[1] - before[1]
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": requests / elapsed,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "queries_per_request": (after[0] - before[0]) / counted if counted else float("nan"),
+    }
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _wait_until_up(client: httpx.AsyncClient, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            await client.get("/")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.2)
+    raise RuntimeError("uvicorn did not start")
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    user_ids, post_ids = await seed(args.users, args.events, args.posts, args.reactions, rng)
+    tokens = await issue_tokens(user_ids, min(len(user_ids), 200))
+    print(f"Seeded {args.users} users, {max(args.events, args.posts)} events, {args.posts} posts, "
+          f"{args.reactions} reactions in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    results = {}
+    if args.transport == "asgi":
+        from main import app
+
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", limits=limits) as client:
+                for name in args.scenarios:
+                    requests = max(1, int(args.requests * SCENARIOS[name][2]))
+                    results[name] = await run_scenario(
+                        client, name, requests, args.concurrency, rng, tokens, post_ids, len(user_ids))
+    else:
+        await engine.dispose()
+        port = _free_port()
+        server = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning",
+            env=os.environ.copy(),
+        )
+        try:
+            async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+                await _wait_until_up(client)
+                for name in args.scenarios:
+                    requests = max(1, int(args.requests * SCENARIOS[name][2]))
+                    results[name] = await run_scenario(
+                        client, name, requests, args.concurrency, rng, tokens, post_ids, len(user_ids))
+        finally:
+            server.terminate()
+            await server.wait()
+    await engine.dispose()
+    return results
+
+
+# Timings may drift by the tolerance; statements per request by half a statement (rounding)
+def regressions(results: dict, baseline: dict, tolerance: float):
+    found = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        if r["queries_per_request"] > base["queries_per_request"] + 0.5:
+            found.append(f"{name}: {r['queries_per_request']:.1f} queries/request (baseline {base['queries_per_request']:.1f})")
+        if r["p95"] > base["p95"] * (1 + tolerance):
+            found.append(f"{name}: p95 {r['p95']:.1f}ms (baseline {base['p95']:.1f}ms)")
+        if r["rps"] < base["rps"] * (1 - tolerance):
+            found.append(f"{name}: {r['rps']:.0f} req/s (baseline {base['rps']:.0f})")
+        if r["errors"]:
+            found.append(f"{name}: {r['errors']} failed requests")
+    return found
+
+
+def params(args) -> dict:
+    return {k: getattr(args, k) for k in ("transport", "users", "events", "posts", "reactions", "requests", "concurrency")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--transport", choices=["asgi", "uvicorn"], default="asgi")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--events", type=int, default=10000)
+    parser.add_argument("--posts", type=int, default=5000)
+    parser.add_argument("--reactions", type=int, default=20000)
+    parser.add_argument("--requests", type=int, default=400, help="Requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed p95/RPS slowdown, as a fraction")
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+
+    print(f"{'scenario':>9} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}")
+    for name, r in results.items():
+        print(
+            f"{name:>9} {r['requests']:>8} {r['errors']:>6} {r['rps']:>8.1f} "
+            f"{r['p50']:>8.2f} {r['p95']:>8.2f} {r['p99']:>8.2f} {r['queries_per_request']:>8.2f}"
+        )
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"params": params(args), "results": results}, f, indent=2)
+            f.write("\n")
+        print(f"Saved baseline to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare with; run with --save-baseline first")
+        return
+    with open(args.baseline) as f:
+        stored = json.load(f)
+    if stored["params"] != params(args):
+        print(f"Baseline was recorded with {stored['params']}; timings may not be comparable")
+    found = regressions(results, stored["results"], args.tolerance)
+    for line in found:
+        print(f"REGRESSION {line}")
+    if found:
+        sys.exit(1)
+    print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
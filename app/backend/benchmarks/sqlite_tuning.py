@@ -0,0 +1,108 @@
+"""p50/p99 latency of concurrent event syncs and feed reads per SQLite PRAGMA profile.
+
+    uv run python -m benchmarks.sqlite_tuning --clients 50 --ops 40
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.future import select
+from sqlmodel import SQLModel
+
+from src.db import SQLITE_PRAGMA_PROFILES, build_engine
+from src.feed import fetch_feed
+from src.models import ScheduleEvent, TimelinePost, User
+
+
+def percentile(samples, q):
+    if len(samples) < 2:
+        return samples[0] if samples else float("nan")
+    return statistics.quantiles(samples, n=100, method="inclusive")[q - 1]
+
+
+async def run_profile(profile: str, clients: int, ops: int, write_ratio: float):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = build_engine(f"sqlite+aiosqlite:///{tmp}/load.db", sqlite_profile=profile)
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+        async with session_maker() as session:
+            users = [
+                User(email=f"load{i}@example.com", hashed_password="x", username=f"load{i}")
+                for i in range(clients)
+            ]
+            session.add_all(users)
+            await session.commit()
+
+        latencies = {"write": [], "read": []}
+        errors = 0
+        rng = random.Random(0)
+
+        async def client(user: User):
+            nonlocal errors
+            for _ in range(ops):
+                kind = "write" if rng.random() < write_ratio else "read"
+                started = time.perf_counter()
+                try:
+                    async with session_maker() as session:
+                        # Same shape as a request: the auth lookup opens a read first
+                        await session.execute(select(User).where(User.id == user.id))
+                        if kind == "write":
+                            now = datetime.utcnow()
+                            event_row = ScheduleEvent(
+                                user_id=user.id, title="sync", category="Work",
+                                start_date=now, end_date=now, is_ai_generated=True,
+                            )
+                            session.add(event_row)
+                            session.add(TimelinePost(user_id=user.id, event_id=event_row.id, content="sync"))
+                            await session.commit()
+                        else:
+                            await fetch_feed(session, user.id, limit=20)
+                except OperationalError:
+                    errors += 1
+                    continue
+                latencies[kind].append((time.perf_counter() - started) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client(user) for user in users))
+        elapsed = time.perf_counter() - started
+        await engine.dispose()
+
+    total = sum(len(v) for v in latencies.values())
+    return {
+        "profile": profile,
+        "ops_per_sec": total / elapsed,
+        "errors": errors,
+        **{f"{kind}_p50": percentile(v, 50) for kind, v in latencies.items()},
+        **{f"{kind}_p99": percentile(v, 99) for kind, v in latencies.items()},
+    }
+
+
+async def run(args):
+    print(f"{'profile':>10} {'ops/s':>8} {'errors':>6} {'write p50':>10} {'write p99':>10} {'read p50':>9} {'read p99':>9}")
+    for profile in args.profiles:
+        r = await run_profile(profile, args.clients, args.ops, args.write_ratio)
+        print(
+            f"{r['profile']:>10} {r['ops_per_sec']:>8.1f} {r['errors']:>6} "
+            f"{r['write_p50']:>10.2f} {r['write_p99']:>10.2f} {r['read_p50']:>9.2f} {r['read_p99']:>9.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--ops", type=int, default=40, help="Operations per client")
+    parser.add_argument("--write-ratio", type=float, default=0.3)
+    parser.add_argument("--profiles", nargs="+", default=["default", "production"], choices=list(SQLITE_PRAGMA_PROFILES))
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
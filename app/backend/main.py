@@ -1,44 +1,79 @@
 from contextlib import asynccontextmanager
-import os
-from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
+from fastapi import Depends, FastAPI
 import uvicorn
 
-from src.auth import auth_backend, fastapi_users
-from src.db import create_db_and_tables
+from src.auth import account_limiter, auth_backend, fastapi_users, ip_limiter, limit_auth_requests
+from src.db import engine
+from src.feed_cache import feed_cache
+from src.storage import STORAGE_DIR, CachedStaticFiles
+from src.jobs import job_queue
+from src.observability import (
+    Gauge, MetricsMiddleware, configure_logging, instrument_engine, metrics_endpoint, register_stats, registry,
+)
+from src.pubsub import broker
 from src.schemas import UserCreate, UserRead, UserUpdate
+from src.server import prepare, prepared
 from src.timeline import router as timeline_router
 from src.routers.events import router as events_router
 from src.routers.profile import router as profile_router
+from src.user_cache import user_cache
+
+configure_logging()
+instrument_engine(engine)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
-    await create_db_and_tables()
+    # Startup (under src.server the parent process has already prepared)
+    if not prepared():
+        await prepare()
+    await broker.start()
+    await job_queue.start()
     yield
     # Shutdown
+    await job_queue.stop()
+    await broker.close()
+    await engine.dispose()
 
 
 app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+
+# Prometheus scrape target: per-route latency and SQL histograms plus cache and job stats
+app.add_route("/metrics", metrics_endpoint, include_in_schema=False)
+register_stats("feed_cache", "Feed page cache", feed_cache.stats, counters=("hits", "misses", "invalidations"))
+register_stats(
+    "user_cache", "Authenticated user cache",
+    lambda: {"hits": user_cache.hits, "misses": user_cache.misses, "entries": len(user_cache)},
+    counters=("hits", "misses"),
+)
+register_stats(
+    "auth_rate_limit", "Auth requests refused with 429",
+    lambda: {"ip_rejected": ip_limiter.rejected, "account_rejected": account_limiter.rejected},
+    counters=("ip_rejected", "account_rejected"),
+)
+register_stats("background_jobs", "Background jobs", job_queue.stats, counters=("processed", "retried", "failed"))
+registry.register(Gauge(
+    "timeline_stream_clients", "Open /v1/timeline/stream connections",
+    lambda: sum(len(s) for s in broker.subscriptions.values()),
+))
 
-# Ensure storage directory exists
-os.makedirs("storage/icons", exist_ok=True)
-
-# Static files for icons
-app.mount("/storage", StaticFiles(directory="storage"), name="storage")
+# Static files for icons (local storage backend); the directory is created by prepare()
+app.mount("/storage", CachedStaticFiles(directory=STORAGE_DIR, check_dir=False), name="storage")
 
 # /v1/auth
 app.include_router(
     fastapi_users.get_auth_router(auth_backend),
     prefix="/v1/auth/jwt",
     tags=["auth"],
+    dependencies=[Depends(limit_auth_requests)],
 )
 
 app.include_router(
     fastapi_users.get_register_router(UserRead, UserCreate),
     prefix="/v1/auth",
     tags=["auth"],
+    dependencies=[Depends(limit_auth_requests)],
 )
 
 # /v1/users
@@ -70,6 +105,7 @@ async def root():
     return {"message": "Hello from VibeCalendar Backend!"}
 
 
+# Development server; production runs `python -m src.server`
 def main():
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
 
@@ -1,50 +1,215 @@
+import logging
 import uuid
 import os
+from datetime import datetime
 from typing import Optional
 from dotenv import load_dotenv
 
-from fastapi import Depends, Request
-from fastapi_users import BaseUserManager, FastAPIUsers, UUIDIDMixin
+import jwt
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import OAuth2PasswordRequestForm
+from fastapi_users import BaseUserManager, FastAPIUsers, UUIDIDMixin, exceptions, schemas
 from fastapi_users.authentication import (
     AuthenticationBackend,
     BearerTransport,
     JWTStrategy,
 )
 from fastapi_users.db import SQLAlchemyUserDatabase
+from fastapi_users.jwt import decode_jwt, generate_jwt
 
+from src.cache import TTLCache
 from src.db import get_user_db
+from src.jobs import enqueue, job
 from src.models import User
+from src.passwords import hash_password, password_helper, verify_and_update
+from src.rate_limit import RateLimiter
 
 load_dotenv()
+logger = logging.getLogger(__name__)
 SECRET = os.getenv('JWT_SECRET')
+JWT_LIFETIME_SECONDS = 3600
+# Hot endpoints trust the profile claims inside the JWT instead of loading the user.
+# A deactivation then takes effect on this replica immediately, elsewhere at token expiry.
+AUTH_TRUST_TOKEN_CLAIMS = os.getenv("AUTH_TRUST_TOKEN_CLAIMS", "").lower() in ("1", "true", "yes")
+# Login and register requests per client IP
+AUTH_IP_LIMIT = int(os.getenv("AUTH_IP_LIMIT", "60"))
+AUTH_IP_WINDOW_SECONDS = float(os.getenv("AUTH_IP_WINDOW_SECONDS", "60"))
+# Failed logins per account before it is locked out for the rest of the window
+AUTH_ACCOUNT_FAILURE_LIMIT = int(os.getenv("AUTH_ACCOUNT_FAILURE_LIMIT", "5"))
+AUTH_ACCOUNT_WINDOW_SECONDS = float(os.getenv("AUTH_ACCOUNT_WINDOW_SECONDS", "300"))
+
+ip_limiter = RateLimiter(AUTH_IP_LIMIT, AUTH_IP_WINDOW_SECONDS)
+account_limiter = RateLimiter(AUTH_ACCOUNT_FAILURE_LIMIT, AUTH_ACCOUNT_WINDOW_SECONDS)
+
+
+# Dependency for the auth routers
+async def limit_auth_requests(request: Request):
+    ip_limiter.check_and_hit(request.client.host if request.client else "unknown")
+
 
 class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
     reset_password_token_secret = SECRET
     verification_token_secret = SECRET
 
+    # The base class hashes inline on the event loop; these three hash on the
+    # password pool instead (src.passwords)
+    async def authenticate(self, credentials: OAuth2PasswordRequestForm) -> Optional[User]:
+        account = credentials.username.lower()
+        # Checked before hashing, so a locked account costs no CPU
+        account_limiter.check(account)
+        try:
+            user = await self.get_by_email(credentials.username)
+        except exceptions.UserNotExists:
+            # Hash anyway so response time doesn't reveal whether the account exists
+            await hash_password(credentials.password)
+            account_limiter.hit(account)
+            return None
+
+        verified, updated_password_hash = await verify_and_update(credentials.password, user.hashed_password)
+        if not verified:
+            account_limiter.hit(account)
+            return None
+        account_limiter.reset(account)
+        # Stored with outdated parameters (or bcrypt): upgrade it
+        if updated_password_hash is not None:
+            await self.user_db.update(user, {"hashed_password": updated_password_hash})
+        return user
+
+    async def create(self, user_create: schemas.UC, safe: bool = False, request: Optional[Request] = None) -> User:
+        await self.validate_password(user_create.password, user_create)
+        if await self.user_db.get_by_email(user_create.email) is not None:
+            raise exceptions.UserAlreadyExists()
+
+        user_dict = user_create.create_update_dict() if safe else user_create.create_update_dict_superuser()
+        user_dict["hashed_password"] = await hash_password(user_dict.pop("password"))
+        created_user = await self.user_db.create(user_dict)
+        await self.on_after_register(created_user, request)
+        return created_user
+
+    async def _update(self, user: User, update_dict: dict) -> User:
+        password = update_dict.get("password")
+        if password is not None:
+            await self.validate_password(password, user)
+            update_dict = {k: v for k, v in update_dict.items() if k != "password"}
+            update_dict["hashed_password"] = await hash_password(password)
+        return await super()._update(user, update_dict)
+
+    # Notifications are delivered by the job queue after the response. The payload
+    # is stored in the job table, so it never carries a token: the job makes it.
+    async def notify(self, user: User, notification: str):
+        session = self.user_db.session
+        await enqueue(session, "notifications.send", notification=notification, user_id=user.id)
+        await session.commit()
+
     async def on_after_register(self, user: User, request: Optional[Request] = None):
-        print(f"User {user.id} has registered.")
+        await self.notify(user, "registered")
+
+    # Same checks as the base class, but the token is left to the notification job
+    async def forgot_password(self, user: User, request: Optional[Request] = None):
+        if not user.is_active:
+            raise exceptions.UserInactive()
+        await self.notify(user, "forgot_password")
+
+    async def request_verify(self, user: User, request: Optional[Request] = None):
+        if not user.is_active:
+            raise exceptions.UserInactive()
+        if user.is_verified:
+            raise exceptions.UserAlreadyVerified()
+        await self.notify(user, "request_verify")
+
+    # Run by the notification job: the base class makes the token and hands it
+    # to the on_after_* hook below, which delivers it
+    async def send_token(self, user: User, notification: str):
+        if notification == "forgot_password":
+            await super().forgot_password(user)
+        else:
+            await super().request_verify(user)
 
     async def on_after_forgot_password(
         self, user: User, token: str, request: Optional[Request] = None
     ):
-        print(f"User {user.id} has forgot their password. Reset token: {token}")
+        deliver_notification(user.id, "forgot_password", token=token)
 
     async def on_after_request_verify(
         self, user: User, token: str, request: Optional[Request] = None
     ):
-        print(f"Verification requested for user {user.id}. Verification token: {token}")
+        deliver_notification(user.id, "request_verify", token=token)
+
+    async def on_after_update(
+        self, user: User, update_dict: dict, request: Optional[Request] = None
+    ):
+        if not user.is_active:
+            revoked_users.set(user.id, True)
+        else:
+            # Reactivated: tokens issued from now on are good again
+            revoked_users.pop(user.id)
+
+    async def on_before_delete(self, user: User, request: Optional[Request] = None):
+        revoked_users.set(user.id, True)
+
+
+# Logged, so never the token itself: anyone reading the logs could use it
+NOTIFICATION_MESSAGES = {
+    "registered": "User {user_id} has registered.",
+    "forgot_password": "User {user_id} has forgot their password. Reset token sent.",
+    "request_verify": "Verification requested for user {user_id}. Verification token sent.",
+}
+
+
+# Stand-in for e-mail / push delivery
+def deliver_notification(user_id: uuid.UUID, notification: str, **data):
+    logger.info(
+        NOTIFICATION_MESSAGES[notification].format(user_id=user_id, **data),
+        extra={"notification": notification, "user_id": str(user_id)},
+    )
+
+
+@job("notifications.send")
+async def send_notification(db, payload: dict):
+    notification = payload["notification"]
+    user_id = uuid.UUID(payload["user_id"])
+    if notification not in ("forgot_password", "request_verify"):
+        deliver_notification(user_id, notification)
+        return
+
+    user = await db.get(User, user_id)
+    if user is None:
+        return
+    try:
+        await UserManager(SQLAlchemyUserDatabase(db, User), password_helper).send_token(user, notification)
+    except (exceptions.UserInactive, exceptions.UserAlreadyVerified):
+        # Changed since the request; nothing to send
+        pass
 
 
 async def get_user_manager(user_db: SQLAlchemyUserDatabase = Depends(get_user_db)):
-    yield UserManager(user_db)
+    yield UserManager(user_db, password_helper)
 
 
 bearer_transport = BearerTransport(tokenUrl="auth/jwt/login")
 
 
+# Users deactivated or deleted on this replica while their tokens are still valid
+revoked_users = TTLCache(maxsize=10000, ttl=JWT_LIFETIME_SECONDS)
+
+
+class ClaimsJWTStrategy(JWTStrategy):
+    # Adds the profile fields hot endpoints need, so they can skip the user lookup.
+    # Only those: the payload is readable by anyone holding the token.
+    async def write_token(self, user: User) -> str:
+        data = {
+            "sub": str(user.id),
+            "aud": self.token_audience,
+            "username": user.username,
+            "created_at": user.created_at.isoformat(),
+        }
+        return generate_jwt(
+            data, self.encode_key, self.lifetime_seconds, algorithm=self.algorithm
+        )
+
+
 def get_jwt_strategy() -> JWTStrategy:
-    return JWTStrategy(secret=SECRET, lifetime_seconds=3600)
+    return ClaimsJWTStrategy(secret=SECRET, lifetime_seconds=JWT_LIFETIME_SECONDS)
 
 
 auth_backend = AuthenticationBackend(
@@ -59,3 +224,40 @@ fastapi_users = FastAPIUsers[User, uuid.UUID](
 )
 
 current_active_user = fastapi_users.current_user(active=True)
+current_superuser = fastapi_users.current_user(active=True, superuser=True)
+
+
+async def current_user_from_claims(
+    token: Optional[str] = Depends(bearer_transport.scheme),
+    user_manager: UserManager = Depends(get_user_manager),
+) -> User:
+    if token is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    strategy = get_jwt_strategy()
+    try:
+        data = decode_jwt(token, strategy.decode_key, strategy.token_audience, algorithms=[strategy.algorithm])
+    except jwt.PyJWTError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+
+    if "username" not in data:
+        # Token issued before claims were added: fall back to the lookup
+        user = await strategy.read_token(token, user_manager)
+        if user is None or not user.is_active:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+        return user
+
+    user_id = uuid.UUID(data["sub"])
+    if revoked_users.get(user_id):
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
+    # Not in the token; hot endpoints don't read it
+    return User(
+        id=user_id,
+        email="",
+        username=data["username"],
+        created_at=datetime.fromisoformat(data["created_at"]),
+        hashed_password="",
+    )
+
+
+# Dependency for the feed, reaction and event routes
+current_hot_user = current_user_from_claims if AUTH_TRUST_TOKEN_CLAIMS else current_active_user
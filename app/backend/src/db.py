@@ -1,15 +1,86 @@
+import os
 from collections.abc import AsyncGenerator
+from dotenv import load_dotenv
 
 from fastapi import Depends
-from fastapi_users.db import SQLAlchemyUserDatabase
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlmodel import SQLModel
 
-from src.models import User, ScheduleEvent, UserProfile, TimelinePost  # noqa: F401
+from src.models import User, ScheduleEvent, UserProfile, TimelinePost, EventSyncState  # noqa: F401
+from src.user_cache import CachedUserDatabase
 
-DATABASE_URL = "sqlite+aiosqlite:///./database.db"
+load_dotenv()
 
-engine = create_async_engine(DATABASE_URL)
+# sqlite+aiosqlite for local/single-node, postgresql+asyncpg for shared deployments
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./database.db")
+
+# PRAGMA profiles applied to every new SQLite connection.
+# "production": WAL lets readers run alongside the single writer, NORMAL sync is
+# durable under WAL except on power loss, busy_timeout makes writers queue instead
+# of failing with "database is locked", mmap/cache keep hot pages in memory.
+# "default": SQLite's stock settings (rollback journal, FULL sync).
+SQLITE_PRAGMA_PROFILES = {
+    "production": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+        "mmap_size": int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024))),
+        # Negative values are KiB
+        "cache_size": -int(os.getenv("SQLITE_CACHE_SIZE_KIB", str(64 * 1024))),
+        "temp_store": "MEMORY",
+    },
+    "default": {},
+}
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "production")
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_ECHO = os.getenv("DB_ECHO", "").lower() in ("1", "true", "yes")
+
+
+def _sqlite_pragma_listener(pragmas: dict):
+    def apply(dbapi_connection, _connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return apply
+
+
+def build_engine(
+    url: str = DATABASE_URL,
+    sqlite_profile: str = SQLITE_PROFILE,
+    pool_size: int = DB_POOL_SIZE,
+    max_overflow: int = DB_MAX_OVERFLOW,
+) -> AsyncEngine:
+    options = {"echo": DB_ECHO}
+    is_sqlite = url.startswith("sqlite")
+    in_memory = is_sqlite and (":memory:" in url or url.rstrip("/").endswith(":"))
+
+    if not in_memory:
+        options.update(
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+    if not is_sqlite:
+        # Drop connections the server closed while idle
+        options.update(pool_pre_ping=True, pool_recycle=1800)
+
+    engine = create_async_engine(url, **options)
+
+    if is_sqlite:
+        pragmas = SQLITE_PRAGMA_PROFILES[sqlite_profile]
+        if pragmas:
+            event.listen(engine.sync_engine, "connect", _sqlite_pragma_listener(pragmas))
+    return engine
+
+
+engine = build_engine()
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
 
@@ -18,10 +89,17 @@ async def create_db_and_tables():
         await conn.run_sync(SQLModel.metadata.create_all)
 
 
+def dialect_insert(db: AsyncSession, model):
+    # INSERT ... ON CONFLICT is dialect-specific; pick the construct for the bound engine
+    if db.bind.dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
         yield session
 
 
 async def get_user_db(session: AsyncSession = Depends(get_async_session)):
-    yield SQLAlchemyUserDatabase(session, User)
+    yield CachedUserDatabase(session, User)
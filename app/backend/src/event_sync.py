@@ -0,0 +1,150 @@
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from typing import List, Tuple
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from src.db import dialect_insert
+from src.home_timeline import fan_out_posts
+from src.models import EventSyncState, ScheduleEvent, ScheduleEventCreate, TimelinePost
+
+# Outcome of syncing one item: "created", "updated" or "unchanged"
+SyncOutcome = Tuple[ScheduleEvent, str]
+
+
+# Default content for now. In future, we could generate this description too.
+def build_auto_post(db_event: ScheduleEvent) -> TimelinePost:
+    return TimelinePost(
+        user_id=db_event.user_id,
+        event_id=db_event.id,
+        content=f"{db_event.title}",
+        category=db_event.category,
+        event_date=db_event.start_date.strftime("%Y/%m/%d"),
+        color_hex=db_event.color_hex
+    )
+
+
+def _same(stored, incoming) -> bool:
+    # SQLite keeps the wall-clock time and drops tzinfo, so compare the same way
+    if isinstance(stored, datetime) and isinstance(incoming, datetime):
+        return stored.replace(tzinfo=None) == incoming.replace(tzinfo=None)
+    return stored == incoming
+
+
+# Bumps the user's calendar version in the caller's transaction
+async def touch_calendar(db: AsyncSession, user_id: uuid.UUID):
+    now = datetime.utcnow()
+    insert_state = dialect_insert(db, EventSyncState).values(user_id=user_id, version=1, modified_at=now)
+    await db.execute(insert_state.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={"version": EventSyncState.version + 1, "modified_at": now},
+    ))
+
+
+# State of an event before it was changed: (event, old title, was AI generated)
+EventChange = Tuple[ScheduleEvent, str, bool]
+
+
+def snapshot(db_event: ScheduleEvent) -> EventChange:
+    return db_event, db_event.title, db_event.is_ai_generated
+
+
+# Keeps timeline posts of changed events in step. Only content that still
+# equals the old title (i.e. the auto-generated text) is rewritten, and an
+# auto post is added when an event turns AI generated.
+async def sync_linked_posts(db: AsyncSession, changed: List[EventChange]):
+    if not changed:
+        return
+    result = await db.execute(
+        select(TimelinePost).where(TimelinePost.event_id.in_([e.id for e, _, _ in changed]))
+    )
+    linked = defaultdict(list)
+    for post in result.scalars():
+        linked[post.event_id].append(post)
+
+    added = []
+    for db_event, old_title, was_ai in changed:
+        posts = linked[db_event.id]
+        if not posts and db_event.is_ai_generated and not was_ai:
+            added.append(build_auto_post(db_event))
+            continue
+        fresh = build_auto_post(db_event)
+        for post in posts:
+            if post.content == old_title:
+                post.content = fresh.content
+            post.category = fresh.category
+            post.event_date = fresh.event_date
+            post.color_hex = fresh.color_hex
+
+    db.add_all(added)
+    await fan_out_posts(db, added)
+
+
+# Applies a batch of events for one user inside the caller's transaction.
+# With upsert, items whose ek_event_id already exists are compared field by
+# field: identical ones are left alone, changed ones are updated in place.
+# New rows and their auto posts go in with one multi-row INSERT each.
+async def sync_events(
+    db: AsyncSession,
+    user_id: uuid.UUID,
+    events: List[ScheduleEventCreate],
+    upsert: bool = True,
+) -> List[SyncOutcome]:
+    existing = {}
+    if upsert:
+        ek_ids = {e.ek_event_id for e in events if e.ek_event_id}
+        if ek_ids:
+            result = await db.execute(select(ScheduleEvent).where(
+                ScheduleEvent.user_id == user_id,
+                ScheduleEvent.ek_event_id.in_(ek_ids)
+            ))
+            existing = {e.ek_event_id: e for e in result.scalars()}
+
+    created: List[ScheduleEvent] = []
+    # Rows that are new or already snapshotted in this batch
+    seen_ids = set()
+    changed: List[EventChange] = []
+    outcomes: List[SyncOutcome] = []
+
+    for event in events:
+        data = event.model_dump()
+        current = existing.get(event.ek_event_id) if event.ek_event_id else None
+
+        if current is None:
+            db_event = ScheduleEvent(**data, user_id=user_id)
+            created.append(db_event)
+            seen_ids.add(db_event.id)
+            if upsert and event.ek_event_id:
+                # A repeated ek_event_id later in the same batch updates this row
+                existing[event.ek_event_id] = db_event
+            outcomes.append((db_event, "created"))
+            continue
+
+        changes = {k: v for k, v in data.items() if not _same(getattr(current, k), v)}
+        if current.deleted_at is not None:
+            # Re-sent after a delete: bring the tombstone back to life
+            changes["deleted_at"] = None
+        if not changes:
+            outcomes.append((current, "unchanged"))
+            continue
+
+        if current.id not in seen_ids:
+            seen_ids.add(current.id)
+            changed.append(snapshot(current))
+        for key, value in changes.items():
+            setattr(current, key, value)
+        current.updated_at = datetime.utcnow()
+        outcomes.append((current, "updated"))
+
+    if created:
+        await db.execute(insert(ScheduleEvent), [e.model_dump() for e in created])
+        auto_posts = [build_auto_post(e) for e in created if e.is_ai_generated]
+        if auto_posts:
+            await db.execute(insert(TimelinePost), [p.model_dump() for p in auto_posts])
+            await fan_out_posts(db, auto_posts)
+    await sync_linked_posts(db, changed)
+    if any(outcome != "unchanged" for _, outcome in outcomes):
+        await touch_calendar(db, user_id)
+
+    return outcomes
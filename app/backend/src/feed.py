@@ -0,0 +1,114 @@
+import base64
+import uuid
+from datetime import datetime
+from typing import List, Optional, Tuple
+from sqlalchemy import literal, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from src.models import (
+    REACTION_COUNT_COLUMNS, ReactionCounts, TimelinePost, TimelinePostRead,
+    TimelineReaction, TimelineFeedResponse, User
+)
+
+
+# A correlated per-row subquery keeps the whole page in one statement:
+# posts, authors, reaction counters and the viewer's reaction come back together.
+def my_reaction_column(viewer_id: uuid.UUID):
+    return (
+        select(TimelineReaction.reaction_type)
+        .where(
+            TimelineReaction.post_id == TimelinePost.id,
+            TimelineReaction.user_id == viewer_id,
+        )
+        .correlate(TimelinePost)
+        .limit(1)
+        .scalar_subquery()
+    )
+
+
+def feed_statement(viewer_id: uuid.UUID):
+    return (
+        select(TimelinePost, User, my_reaction_column(viewer_id).label("my_reaction"))
+        .join(User, TimelinePost.user_id == User.id)
+    )
+
+
+# Keyset cursor: the (created_at, id) of the last post on the previous page,
+# base64url-encoded so clients treat it as opaque.
+FeedCursor = Tuple[datetime, uuid.UUID]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(post: TimelinePostRead) -> str:
+    raw = f"{post.created_at.isoformat()}|{post.id.hex}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> FeedCursor:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, post_id = raw.split("|")
+        return datetime.fromisoformat(created_at), uuid.UUID(post_id)
+    except ValueError as e:
+        raise InvalidCursor(cursor) from e
+
+
+def reaction_counts(post: TimelinePost) -> ReactionCounts:
+    return ReactionCounts(**{
+        reaction_type: getattr(post, column)
+        for reaction_type, column in REACTION_COUNT_COLUMNS.items()
+    })
+
+
+def feed_order():
+    return (TimelinePost.created_at.desc(), TimelinePost.id.desc())
+
+
+# Keyset condition: rows strictly after the cursor in feed order
+def after_cursor(created_at_column, id_column, cursor: FeedCursor):
+    created_at, post_id = cursor
+    return tuple_(created_at_column, id_column) < tuple_(
+        literal(created_at, TimelinePost.created_at.type),
+        literal(post_id, TimelinePost.id.type),
+    )
+
+
+# Loads the posts whose ids the `page` subquery selects, newest first
+async def load_feed_page(db: AsyncSession, viewer_id: uuid.UUID, page) -> List[TimelineFeedResponse]:
+    stmt = (
+        feed_statement(viewer_id)
+        .join(page, page.c.id == TimelinePost.id)
+        .order_by(*feed_order())
+    )
+    result = await db.execute(stmt)
+
+    return [
+        TimelineFeedResponse(
+            post=post,
+            user=author,
+            likes=post.like_count,
+            reactions=reaction_counts(post),
+            my_reaction=my_reaction,
+        )
+        for post, author, my_reaction in result.all()
+    ]
+
+
+async def fetch_feed(
+    db: AsyncSession,
+    viewer_id: uuid.UUID,
+    limit: int,
+    offset: int = 0,
+    cursor: Optional[FeedCursor] = None,
+) -> List[TimelineFeedResponse]:
+    # Pick the page first so the per-row subqueries only run for `limit` posts
+    page = select(TimelinePost.id).order_by(*feed_order()).limit(limit)
+    if cursor is not None:
+        # Seek on ix_timelinepost_created_at_id instead of skipping rows
+        page = page.where(after_cursor(TimelinePost.created_at, TimelinePost.id, cursor))
+    else:
+        page = page.offset(offset)
+    return await load_feed_page(db, viewer_id, page.subquery())
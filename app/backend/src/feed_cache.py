@@ -0,0 +1,152 @@
+import json
+import os
+import uuid
+from typing import Dict, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from src.cache import TTLCache
+from src.feed import FeedCursor, fetch_feed
+from src.models import TimelineFeedResponse, TimelineReaction
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis is optional; only needed for FEED_CACHE_BACKEND=redis
+    aioredis = None
+
+# Shared feed pages without the viewer-specific my_reaction, which is merged
+# in per request. Any write that changes what a page shows bumps the cache
+# generation, which is part of every key, so pages read before the write can
+# never be stored under a key that is still live.
+FEED_CACHE_BACKEND = os.getenv("FEED_CACHE_BACKEND", "memory")  # memory | redis | off
+FEED_CACHE_TTL_SECONDS = float(os.getenv("FEED_CACHE_TTL_SECONDS", "30"))
+FEED_CACHE_MAX_PAGES = int(os.getenv("FEED_CACHE_MAX_PAGES", "256"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+class MemoryFeedBackend:
+    def __init__(self, maxsize: int = FEED_CACHE_MAX_PAGES, ttl: float = FEED_CACHE_TTL_SECONDS):
+        self.pages = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._generation = 0
+
+    async def generation(self) -> int:
+        return self._generation
+
+    async def bump(self):
+        self._generation += 1
+        self.pages.clear()
+
+    # Entries are shared between requests and must not be mutated
+    async def get(self, key: str) -> Optional[List[TimelineFeedResponse]]:
+        return self.pages.get(key)
+
+    async def set(self, key: str, page: List[TimelineFeedResponse]):
+        self.pages.set(key, page)
+
+
+class RedisFeedBackend:
+    def __init__(self, url: str = REDIS_URL, ttl: float = FEED_CACHE_TTL_SECONDS, prefix: str = "feed"):
+        if aioredis is None:
+            raise RuntimeError("FEED_CACHE_BACKEND=redis needs the redis package")
+        self.redis = aioredis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def generation(self) -> int:
+        return int(await self.redis.get(f"{self.prefix}:generation") or 0)
+
+    async def bump(self):
+        # Old pages are left to expire through their TTL
+        await self.redis.incr(f"{self.prefix}:generation")
+
+    async def get(self, key: str) -> Optional[List[TimelineFeedResponse]]:
+        raw = await self.redis.get(f"{self.prefix}:{key}")
+        if raw is None:
+            return None
+        return [TimelineFeedResponse.model_validate(item) for item in json.loads(raw)]
+
+    async def set(self, key: str, page: List[TimelineFeedResponse]):
+        raw = json.dumps([item.model_dump(mode="json") for item in page])
+        await self.redis.set(f"{self.prefix}:{key}", raw, ex=max(1, int(self.ttl)))
+
+
+FEED_CACHE_BACKENDS = {
+    "memory": MemoryFeedBackend,
+    "redis": RedisFeedBackend,
+}
+
+
+def _page_key(generation: int, limit: int, offset: int, cursor: Optional[FeedCursor]) -> str:
+    after = f"{cursor[0].isoformat()}|{cursor[1].hex}" if cursor else ""
+    return f"{generation}:{limit}:{offset}:{after}"
+
+
+async def merge_my_reactions(
+    db: AsyncSession, viewer_id: uuid.UUID, page: List[TimelineFeedResponse]
+) -> List[TimelineFeedResponse]:
+    if not page:
+        return []
+    result = await db.execute(
+        select(TimelineReaction.post_id, TimelineReaction.reaction_type).where(
+            TimelineReaction.user_id == viewer_id,
+            TimelineReaction.post_id.in_([item.post.id for item in page]),
+        )
+    )
+    mine: Dict[uuid.UUID, str] = dict(result.all())
+    return [item.model_copy(update={"my_reaction": mine.get(item.post.id)}) for item in page]
+
+
+class FeedCache:
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def fetch(
+        self,
+        db: AsyncSession,
+        viewer_id: uuid.UUID,
+        limit: int,
+        offset: int = 0,
+        cursor: Optional[FeedCursor] = None,
+    ) -> List[TimelineFeedResponse]:
+        if self.backend is None:
+            return await fetch_feed(db, viewer_id, limit=limit, offset=offset, cursor=cursor)
+
+        key = _page_key(await self.backend.generation(), limit, offset, cursor)
+        page = await self.backend.get(key)
+        if page is not None:
+            self.hits += 1
+            return await merge_my_reactions(db, viewer_id, page)
+
+        self.misses += 1
+        feed = await fetch_feed(db, viewer_id, limit=limit, offset=offset, cursor=cursor)
+        await self.backend.set(key, [item.model_copy(update={"my_reaction": None}) for item in feed])
+        return feed
+
+    # Call after the write has committed
+    async def invalidate(self):
+        if self.backend is not None:
+            self.invalidations += 1
+            await self.backend.bump()
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def build_feed_cache(backend: str = FEED_CACHE_BACKEND) -> FeedCache:
+    if backend == "off":
+        return FeedCache()
+    try:
+        return FeedCache(FEED_CACHE_BACKENDS[backend]())
+    except KeyError:
+        raise ValueError(f"Unknown FEED_CACHE_BACKEND {backend!r}, expected off or one of {', '.join(FEED_CACHE_BACKENDS)}")
+
+
+feed_cache = build_feed_cache()
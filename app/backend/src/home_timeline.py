@@ -0,0 +1,268 @@
+import argparse
+import asyncio
+import os
+import uuid
+from typing import Dict, List, Optional
+from sqlalchemy import delete, func, literal, true, tuple_, union_all, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from src.db import async_session_maker, dialect_insert, engine
+from src.jobs import enqueue, job
+from src.feed import FeedCursor, after_cursor, feed_order, fetch_feed, load_feed_page
+from src.models import HomeTimelineEntry, TimelineFeedResponse, TimelinePost, User
+
+# global: every reader pages through the shared created_at DESC feed.
+# fanout: posts are copied into each reader's HomeTimelineEntry rows when they
+# are written, so reading a page is one range scan over the reader's rows.
+HOME_TIMELINE_MODE = os.getenv("HOME_TIMELINE_MODE", "global")
+# Rows kept per reader; older pages come from the shared feed
+HOME_TIMELINE_DEPTH = int(os.getenv("HOME_TIMELINE_DEPTH", "800"))
+# Authors with a larger audience are merged in at read time instead
+HOME_TIMELINE_FANOUT_LIMIT = int(os.getenv("HOME_TIMELINE_FANOUT_LIMIT", "10000"))
+# Fanned-out posts between two trims
+HOME_TIMELINE_TRIM_EVERY = int(os.getenv("HOME_TIMELINE_TRIM_EVERY", "100"))
+
+_fanned_out_since_trim = 0
+
+
+def fan_out_enabled() -> bool:
+    return HOME_TIMELINE_MODE == "fanout"
+
+
+# Who sees an author's posts. Everyone does today; once follows or visibility
+# rules exist, these two are the only places that need to know about them.
+def audience(author_id: uuid.UUID):
+    return select(User.id).where(User.is_active.is_(True))
+
+
+def visible_to(viewer_id: uuid.UUID):
+    return true()
+
+
+async def audience_size(db: AsyncSession, author_id: uuid.UUID) -> int:
+    return await db.scalar(select(func.count()).select_from(audience(author_id).subquery()))
+
+
+# Schedules the fan-out in the caller's transaction; it runs after the response.
+# The author's own rows are written right away so their new posts show in their
+# own home timeline before the job has run.
+async def fan_out_posts(db: AsyncSession, posts: List[TimelinePost]):
+    if fan_out_enabled() and posts:
+        await db.flush()
+        for post in posts:
+            await _insert_entries(db, post, select(literal(post.user_id, User.id.type)))
+        await enqueue(db, "home_timeline.fan_out", post_ids=[post.id for post in posts])
+
+
+# Jobs are delivered at least once, so running this twice for the same posts
+# must be harmless: rows already written are skipped by the insert. If the job
+# fails for good, the posts are missing above each reader's oldest kept row
+# until `python -m src.home_timeline rebuild` runs.
+@job("home_timeline.fan_out")
+async def _fan_out_job(db: AsyncSession, payload: dict):
+    result = await db.execute(
+        select(TimelinePost).where(TimelinePost.id.in_([uuid.UUID(i) for i in payload["post_ids"]]))
+    )
+    # Posts deleted in the meantime are simply skipped
+    await write_to_home_timelines(db, list(result.scalars()))
+
+
+# INSERT ... SELECT of one post into the given readers' timelines, skipping
+# readers who already have it. SQLite only parses ON CONFLICT after an
+# INSERT ... SELECT that has a WHERE clause.
+async def _insert_entries(db: AsyncSession, post: TimelinePost, readers):
+    readers = readers.subquery()
+    await db.execute(dialect_insert(db, HomeTimelineEntry).from_select(
+        ["user_id", "post_id", "created_at"],
+        select(
+            *readers.c,
+            literal(post.id, TimelinePost.id.type),
+            literal(post.created_at, TimelinePost.created_at.type),
+        ).where(true()),
+    ).on_conflict_do_nothing())
+
+
+# Writes the posts into their readers' home timelines with one INSERT ... SELECT
+# per post. Posts by authors over the fan-out limit are flagged and picked up
+# by readers at read time instead.
+async def write_to_home_timelines(db: AsyncSession, posts: List[TimelinePost]):
+    global _fanned_out_since_trim
+    if not posts:
+        return
+    await db.flush()
+
+    sizes: Dict[uuid.UUID, int] = {}
+    pulled = []
+    for post in posts:
+        if post.user_id not in sizes:
+            sizes[post.user_id] = await audience_size(db, post.user_id)
+        if sizes[post.user_id] > HOME_TIMELINE_FANOUT_LIMIT:
+            pulled.append(post.id)
+            continue
+        await _insert_entries(db, post, audience(post.user_id))
+    if pulled:
+        await db.execute(update(TimelinePost).where(TimelinePost.id.in_(pulled)).values(fan_out_on_read=True))
+        # The author's own row would show the post twice next to the pulled copy
+        await db.execute(delete(HomeTimelineEntry).where(HomeTimelineEntry.post_id.in_(pulled)))
+
+    _fanned_out_since_trim += len(posts) - len(pulled)
+    if _fanned_out_since_trim >= HOME_TIMELINE_TRIM_EVERY:
+        _fanned_out_since_trim = 0
+        await trim_home_timelines(db)
+
+
+async def remove_from_home_timelines(db: AsyncSession, post_id: uuid.UUID):
+    await db.execute(delete(HomeTimelineEntry).where(HomeTimelineEntry.post_id == post_id))
+
+
+# Drops every reader's rows beyond `depth`, newest kept
+async def trim_home_timelines(db: AsyncSession, depth: Optional[int] = None) -> int:
+    ranked = select(
+        HomeTimelineEntry.user_id,
+        HomeTimelineEntry.post_id,
+        func.row_number().over(
+            partition_by=HomeTimelineEntry.user_id,
+            order_by=(HomeTimelineEntry.created_at.desc(), HomeTimelineEntry.post_id.desc()),
+        ).label("rank"),
+    ).subquery()
+    stale = select(ranked.c.user_id, ranked.c.post_id).where(ranked.c.rank > (depth or HOME_TIMELINE_DEPTH))
+    result = await db.execute(
+        delete(HomeTimelineEntry).where(tuple_(HomeTimelineEntry.user_id, HomeTimelineEntry.post_id).in_(stale))
+    )
+    return result.rowcount
+
+
+# (created_at, post_id) of the reader's oldest kept row
+def oldest_kept(viewer_id: uuid.UUID):
+    return (
+        select(HomeTimelineEntry.created_at, HomeTimelineEntry.post_id)
+        .where(HomeTimelineEntry.user_id == viewer_id)
+        .order_by(HomeTimelineEntry.created_at, HomeTimelineEntry.post_id)
+        .limit(1)
+    )
+
+
+async def fetch_home_feed(
+    db: AsyncSession,
+    viewer_id: uuid.UUID,
+    limit: int,
+    offset: int = 0,
+    cursor: Optional[FeedCursor] = None,
+) -> List[TimelineFeedResponse]:
+    window = limit if cursor is not None else limit + offset
+    # The reader's oldest kept row. Above it the page merges their rows with the
+    # posts pulled at read time; below it, both come from the shared feed.
+    floor = oldest_kept(viewer_id).scalar_subquery()
+    pushed = select(HomeTimelineEntry.post_id.label("id"), HomeTimelineEntry.created_at).where(
+        HomeTimelineEntry.user_id == viewer_id
+    )
+    pulled = select(TimelinePost.id, TimelinePost.created_at).where(
+        TimelinePost.fan_out_on_read.is_(True),
+        visible_to(viewer_id),
+        tuple_(TimelinePost.created_at, TimelinePost.id) > floor,
+    )
+    if cursor is not None:
+        pushed = pushed.where(after_cursor(HomeTimelineEntry.created_at, HomeTimelineEntry.post_id, cursor))
+        pulled = pulled.where(after_cursor(TimelinePost.created_at, TimelinePost.id, cursor))
+    # Each side is a bounded scan of its own index before the merge
+    pushed = pushed.order_by(HomeTimelineEntry.created_at.desc(), HomeTimelineEntry.post_id.desc()).limit(window)
+    pulled = pulled.order_by(*feed_order()).limit(window)
+
+    merged = union_all(select(pushed.subquery()), select(pulled.subquery())).subquery()
+    page = (
+        select(merged.c.id)
+        .order_by(merged.c.created_at.desc(), merged.c.id.desc())
+        .limit(limit)
+        .offset(0 if cursor is not None else offset)
+    )
+    feed = await load_feed_page(db, viewer_id, page.subquery())
+
+    # A short page has reached the oldest kept row; older posts, pulled or not,
+    # continue from the shared feed. That is exact while the audience is
+    # everyone; it has to filter by visible_to() once it is not.
+    if len(feed) < limit:
+        if feed:
+            last = feed[-1].post
+            feed += await fetch_feed(db, viewer_id, limit - len(feed), cursor=(last.created_at, last.id))
+        elif cursor is not None:
+            # Already below the oldest kept row (or the reader has none)
+            feed = await fetch_feed(db, viewer_id, limit, cursor=cursor)
+        else:
+            feed = await _fetch_below_floor(db, viewer_id, limit, offset)
+    return feed
+
+
+# Offset paging past everything above the reader's oldest kept row
+async def _fetch_below_floor(db: AsyncSession, viewer_id: uuid.UUID, limit: int, offset: int):
+    oldest = (await db.execute(oldest_kept(viewer_id))).first()
+    if oldest is None:
+        return await fetch_feed(db, viewer_id, limit, offset=offset)
+    floor = tuple(oldest)
+    above = await db.scalar(select(func.count()).select_from(
+        union_all(
+            select(HomeTimelineEntry.post_id).where(HomeTimelineEntry.user_id == viewer_id),
+            select(TimelinePost.id).where(
+                TimelinePost.fan_out_on_read.is_(True),
+                visible_to(viewer_id),
+                tuple_(TimelinePost.created_at, TimelinePost.id) > tuple_(
+                    literal(floor[0], TimelinePost.created_at.type), literal(floor[1], TimelinePost.id.type)
+                ),
+            ),
+        ).subquery()
+    ))
+    page = (
+        select(TimelinePost.id)
+        .where(after_cursor(TimelinePost.created_at, TimelinePost.id, floor))
+        .order_by(*feed_order())
+        .limit(limit)
+        .offset(max(offset - above, 0))
+    )
+    return await load_feed_page(db, viewer_id, page.subquery())
+
+
+# Refills every home timeline from the newest HOME_TIMELINE_DEPTH posts, e.g.
+# after switching HOME_TIMELINE_MODE to fanout
+async def rebuild_home_timelines(db: AsyncSession) -> int:
+    await db.execute(delete(HomeTimelineEntry))
+    await db.execute(update(TimelinePost).values(fan_out_on_read=False))
+    result = await db.execute(select(TimelinePost).order_by(*feed_order()).limit(HOME_TIMELINE_DEPTH))
+    posts = list(result.scalars())
+    await write_to_home_timelines(db, posts)
+    await db.commit()
+    return len(posts)
+
+
+async def _rebuild():
+    async with async_session_maker() as session:
+        count = await rebuild_home_timelines(session)
+    await engine.dispose()
+    print(f"Fanned out {count} posts.")
+
+
+async def _trim():
+    async with async_session_maker() as session:
+        removed = await trim_home_timelines(session)
+        await session.commit()
+    await engine.dispose()
+    print(f"Removed {removed} home timeline entries.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Home timeline maintenance")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("rebuild", help="Refill home timelines from the newest posts (HOME_TIMELINE_MODE=fanout)")
+    subparsers.add_parser("trim", help=f"Trim home timelines to HOME_TIMELINE_DEPTH ({HOME_TIMELINE_DEPTH}) rows")
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        if not fan_out_enabled():
+            parser.error("set HOME_TIMELINE_MODE=fanout first")
+        asyncio.run(_rebuild())
+    elif args.command == "trim":
+        asyncio.run(_trim())
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import hashlib
+import os
+import tempfile
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+from fastapi import UploadFile
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from src.feed_cache import feed_cache
+from src.jobs import enqueue, job
+from src.models import TimelinePost
+from src.storage import storage
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; without it only the original is stored
+    Image = None
+
+# Uploads are staged here before they are handed to the storage backend
+ICON_STAGING_DIR = os.getenv("ICON_STAGING_DIR") or None
+ICON_MAX_BYTES = int(os.getenv("ICON_MAX_BYTES", str(5 * 1024 * 1024)))
+# Longest edge of the thumbnail the feed shows, in pixels
+ICON_THUMBNAIL_SIZE = int(os.getenv("ICON_THUMBNAIL_SIZE", "256"))
+# Larger images are not decoded: a few KiB of PNG can expand to gigabytes
+ICON_MAX_PIXELS = int(os.getenv("ICON_MAX_PIXELS", str(4096 * 4096)))
+CHUNK_SIZE = 64 * 1024
+
+if Image is not None:
+    # Pillow's default (~179 MP) is sized for photos. Open refuses anything over
+    # twice this and only warns in between, so _write_thumbnail checks that range.
+    Image.MAX_IMAGE_PIXELS = ICON_MAX_PIXELS
+
+ICON_EXTENSIONS = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+    "image/heic": ".heic",
+}
+
+
+class IconTooLarge(Exception):
+    pass
+
+
+class UnsupportedIconType(Exception):
+    pass
+
+
+@dataclass
+class StoredIcon:
+    key: str
+    url: str
+    thumbnail_url: Optional[str] = None
+
+
+def _sniff(head: bytes) -> Optional[str]:
+    # Trust the bytes, not the client's Content-Type
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp" and head[8:12] in (b"heic", b"heix", b"mif1", b"msf1"):
+        return "image/heic"
+    return None
+
+
+def _staging_file() -> str:
+    fd, path = tempfile.mkstemp(dir=ICON_STAGING_DIR, suffix=".part")
+    os.close(fd)
+    return path
+
+
+def _discard(path: str):
+    if os.path.exists(path):
+        os.unlink(path)
+
+
+def _write_chunk(out, digest, chunk: bytes):
+    out.write(chunk)
+    digest.update(chunk)
+
+
+def _write_thumbnail(source: str, target: str):
+    with Image.open(source) as image:
+        if image.width * image.height > ICON_MAX_PIXELS:
+            raise Image.DecompressionBombError(f"{image.width}x{image.height} is over ICON_MAX_PIXELS")
+        image.thumbnail((ICON_THUMBNAIL_SIZE, ICON_THUMBNAIL_SIZE))
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA")
+        image.save(target, format="WEBP", quality=80, method=4)
+
+
+def _thumbnail_key(digest: str) -> str:
+    return f"icons/{digest}_{ICON_THUMBNAIL_SIZE}.webp"
+
+
+async def _store_thumbnail(source: str, digest: str) -> Optional[str]:
+    key = _thumbnail_key(digest)
+    if await storage.exists(key):
+        return storage.url(key)
+    tmp_path = await run_in_threadpool(_staging_file)
+    try:
+        await run_in_threadpool(_write_thumbnail, source, tmp_path)
+        await storage.put(key, tmp_path, "image/webp")
+    except (OSError, Image.DecompressionBombError, Image.DecompressionBombWarning):
+        # Formats Pillow can't decode (e.g. HEIC without a plugin) and images over
+        # ICON_MAX_PIXELS keep only the original
+        return None
+    finally:
+        await run_in_threadpool(_discard, tmp_path)
+    return storage.url(key)
+
+
+# Streams an upload to a staging file without blocking the event loop: chunks
+# are read from the spooled upload and written (and hashed) from the thread
+# pool. Icons are stored under their SHA-256, so a replaced icon gets a new URL
+# that can be cached forever and identical uploads share one object.
+async def save_icon(upload: UploadFile) -> StoredIcon:
+    if upload.content_type not in ICON_EXTENSIONS:
+        raise UnsupportedIconType(upload.content_type)
+    if upload.size is not None and upload.size > ICON_MAX_BYTES:
+        raise IconTooLarge(upload.size)
+
+    tmp_path = await run_in_threadpool(_staging_file)
+    try:
+        digest = hashlib.sha256()
+        size = 0
+        # Opened and closed in the thread pool too, like every write below
+        out = await run_in_threadpool(open, tmp_path, "wb")
+        try:
+            while chunk := await upload.read(CHUNK_SIZE):
+                if size == 0 and _sniff(chunk) != upload.content_type:
+                    raise UnsupportedIconType(upload.content_type)
+                size += len(chunk)
+                if size > ICON_MAX_BYTES:
+                    raise IconTooLarge(size)
+                await run_in_threadpool(_write_chunk, out, digest, chunk)
+        finally:
+            await run_in_threadpool(out.close)
+        if size == 0:
+            raise UnsupportedIconType(upload.content_type)
+
+        name = digest.hexdigest()
+        key = f"icons/{name}{ICON_EXTENSIONS[upload.content_type]}"
+        stored = StoredIcon(key=key, url=storage.url(key))
+        if Image is not None and await storage.exists(_thumbnail_key(name)):
+            # Same image uploaded before; otherwise schedule_thumbnail makes one
+            stored.thumbnail_url = storage.url(_thumbnail_key(name))
+        if not await storage.exists(key):
+            await storage.put(key, tmp_path, upload.content_type)
+    finally:
+        await run_in_threadpool(_discard, tmp_path)
+    return stored
+
+
+# Resizing runs as a background job so the upload returns without waiting on Pillow
+async def schedule_thumbnail(db: AsyncSession, post_id: uuid.UUID, stored: StoredIcon):
+    if Image is not None and stored.thumbnail_url is None:
+        await enqueue(db, "icons.thumbnail", post_id=post_id, key=stored.key)
+
+
+@job("icons.thumbnail")
+async def _thumbnail_job(db: AsyncSession, payload: dict):
+    key = payload["key"]
+    tmp_path = await run_in_threadpool(_staging_file)
+    try:
+        await storage.fetch(key, tmp_path)
+        digest = os.path.splitext(os.path.basename(key))[0]
+        thumbnail_url = await _store_thumbnail(tmp_path, digest)
+    finally:
+        await run_in_threadpool(_discard, tmp_path)
+    if thumbnail_url is None:
+        return
+
+    # Only if the post still shows this icon
+    await db.execute(
+        update(TimelinePost)
+        .where(TimelinePost.id == uuid.UUID(payload["post_id"]), TimelinePost.icon_url == storage.url(key))
+        .values(icon_thumbnail_url=thumbnail_url)
+    )
+    await db.commit()
+    await feed_cache.invalidate()
@@ -0,0 +1,190 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import and_, delete, event, or_, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.future import select
+from sqlalchemy.orm import Session
+from src.db import async_session_maker
+from src.models import BackgroundJob
+
+# Side effects that don't need to hold up the response (fan-out, thumbnails,
+# notifications) are written to BackgroundJob in the request's transaction and
+# run by a small worker pool afterwards. A job only exists if the write that
+# caused it committed, and survives restarts until it has run.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+# Retry n waits JOB_RETRY_BASE_SECONDS * 2**(n-1)
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "2"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "300"))
+# How often idle workers look for retries and jobs enqueued by other processes
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "1"))
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[AsyncSession, Dict[str, Any]], Awaitable[None]]
+HANDLERS: Dict[str, Handler] = {}
+
+
+def job(kind: str):
+    def register(handler: Handler) -> Handler:
+        HANDLERS[kind] = handler
+        return handler
+    return register
+
+
+# Adds the job to the caller's transaction; workers are woken on commit
+async def enqueue(db: AsyncSession, kind: str, **payload: Any) -> BackgroundJob:
+    db_job = BackgroundJob(
+        kind=kind,
+        payload=json.dumps(jsonable_encoder(payload)),
+        max_attempts=JOB_MAX_ATTEMPTS,
+    )
+    db.add(db_job)
+    db.sync_session.info["jobs_enqueued"] = True
+    return db_job
+
+
+class JobQueue:
+    def __init__(
+        self,
+        session_maker: async_sessionmaker = async_session_maker,
+        workers: int = JOB_WORKERS,
+        retry_base: float = JOB_RETRY_BASE_SECONDS,
+        lease: float = JOB_LEASE_SECONDS,
+        poll: float = JOB_POLL_SECONDS,
+    ):
+        self.session_maker = session_maker
+        self.workers = workers
+        self.retry_base = retry_base
+        self.lease = lease
+        self.poll = poll
+        self.processed = 0
+        self.retried = 0
+        self.failed = 0
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+        self._stopping = False
+
+    def wake(self):
+        self._wakeup.set()
+
+    # Marks the oldest due job as running and returns it. The conditions are
+    # repeated on the UPDATE so two workers can't claim the same row.
+    async def claim(self) -> Optional[BackgroundJob]:
+        now = datetime.utcnow()
+        due = or_(
+            and_(BackgroundJob.status == "pending", BackgroundJob.run_after <= now),
+            and_(BackgroundJob.status == "running", BackgroundJob.locked_until < now),
+        )
+        candidate = select(BackgroundJob.id).where(due).order_by(BackgroundJob.run_after).limit(1).scalar_subquery()
+        async with self.session_maker() as session:
+            result = await session.execute(
+                update(BackgroundJob)
+                .where(BackgroundJob.id == candidate, due)
+                .values(
+                    status="running",
+                    attempts=BackgroundJob.attempts + 1,
+                    locked_until=now + timedelta(seconds=self.lease),
+                )
+                .returning(BackgroundJob)
+            )
+            db_job = result.scalars().first()
+            await session.commit()
+            return db_job
+
+    async def _finish(self, db_job: BackgroundJob, error: Optional[BaseException] = None):
+        async with self.session_maker() as session:
+            if error is None:
+                self.processed += 1
+                await session.execute(delete(BackgroundJob).where(BackgroundJob.id == db_job.id))
+            elif db_job.attempts < db_job.max_attempts:
+                self.retried += 1
+                delay = self.retry_base * 2 ** (db_job.attempts - 1)
+                await session.execute(update(BackgroundJob).where(BackgroundJob.id == db_job.id).values(
+                    status="pending",
+                    run_after=datetime.utcnow() + timedelta(seconds=delay),
+                    locked_until=None,
+                    last_error=repr(error),
+                ))
+            else:
+                self.failed += 1
+                await session.execute(update(BackgroundJob).where(BackgroundJob.id == db_job.id).values(
+                    status="failed",
+                    locked_until=None,
+                    last_error=repr(error),
+                ))
+            await session.commit()
+
+    # Runs one due job, if any. Returns whether there was one.
+    async def run_one(self) -> bool:
+        db_job = await self.claim()
+        if db_job is None:
+            return False
+        try:
+            handler = HANDLERS.get(db_job.kind)
+            if handler is None:
+                raise LookupError(f"No handler for job kind {db_job.kind!r}")
+            async with self.session_maker() as session:
+                await handler(session, json.loads(db_job.payload))
+                await session.commit()
+        except Exception as e:
+            logger.exception("Job %s (%s) failed on attempt %d", db_job.id, db_job.kind, db_job.attempts)
+            await self._finish(db_job, e)
+        else:
+            await self._finish(db_job)
+        return True
+
+    # Runs jobs until none are due
+    async def drain(self) -> int:
+        count = 0
+        while await self.run_one():
+            count += 1
+        return count
+
+    async def _work(self):
+        while not self._stopping:
+            self._wakeup.clear()
+            try:
+                if await self.run_one():
+                    continue
+            except Exception:
+                logger.exception("Job worker error")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll)
+            except asyncio.TimeoutError:
+                pass
+
+    async def start(self):
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    # Lets running jobs finish; a job cut off by the timeout is retried after its lease
+    async def stop(self, timeout: float = 10):
+        self._stopping = True
+        self.wake()
+        if not self._tasks:
+            return
+        _, pending = await asyncio.wait(self._tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> Dict[str, int]:
+        return {"processed": self.processed, "retried": self.retried, "failed": self.failed}
+
+
+job_queue = JobQueue()
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_workers(session: Session):
+    if session.info.pop("jobs_enqueued", False):
+        job_queue.wake()
+
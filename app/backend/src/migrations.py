@@ -0,0 +1,194 @@
+import argparse
+import asyncio
+from datetime import datetime
+from typing import Callable, List, NamedTuple
+from sqlalchemy import (
+    Column, Connection, DateTime, Integer, MetaData, String, Table,
+    delete, func, inspect, insert, literal, update,
+)
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.future import select
+from sqlmodel import SQLModel
+from src.db import create_db_and_tables, engine
+from src.models import EventSyncState, HomeTimelineEntry, ScheduleEvent, TimelinePost, TimelineReaction
+from src.reactions import reaction_counter_values
+
+# Versioned schema changes for databases created before a model change.
+# create_all only creates missing tables, so anything that alters an existing
+# table (new columns, new indexes, data fixes) goes here. Every step must be
+# idempotent: on a fresh database create_all has already built the latest schema.
+
+_bookkeeping = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    _bookkeeping,
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[[Connection], None]
+
+
+# Adds a model column to an existing table. The type is rendered from the model
+# for the connected dialect; constraints are plain SQL that every backend accepts.
+def add_column(conn: Connection, column: Column, constraints: str = ""):
+    table = column.table.name
+    columns = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column.name not in columns:
+        ddl = f"{column.type.compile(conn.dialect)} {constraints}".rstrip()
+        conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column.name} {ddl}")
+
+
+def create_indexes(conn: Connection, *names: str):
+    # Builds indexes declared on the models, by name, if they are missing
+    declared = {
+        index.name: index
+        for table in SQLModel.metadata.sorted_tables
+        for index in table.indexes
+    }
+    for name in names:
+        declared[name].create(conn, checkfirst=True)
+
+
+def _reaction_counter_columns(conn: Connection):
+    for name in ("like_count", "point_count", "thumbs_up_count", "hand_count", "pinch_count"):
+        add_column(conn, TimelinePost.__table__.c[name], "NOT NULL DEFAULT 0")
+
+
+def _dedupe_reactions(conn: Connection):
+    # Keep the newest reaction per (post_id, user_id) so the unique index can be built
+    ranked = select(
+        TimelineReaction.id,
+        func.row_number().over(
+            partition_by=(TimelineReaction.post_id, TimelineReaction.user_id),
+            order_by=(TimelineReaction.created_at.desc(), TimelineReaction.id.desc()),
+        ).label("rank"),
+    ).subquery()
+    conn.execute(
+        delete(TimelineReaction).where(
+            TimelineReaction.id.in_(select(ranked.c.id).where(ranked.c.rank > 1))
+        )
+    )
+
+
+def _foreign_key_and_feed_indexes(conn: Connection):
+    create_indexes(
+        conn,
+        "ix_scheduleevent_user_id",
+        "ix_timelinepost_user_id",
+        "ix_timelinepost_event_id",
+        "ix_timelinepost_created_at_id",
+        "ix_timelinereaction_user_id",
+        "ux_timelinereaction_post_id_user_id",
+    )
+
+
+def _rebuild_reaction_counters(conn: Connection):
+    conn.execute(update(TimelinePost).values(reaction_counter_values()))
+
+
+def _unique_event_ek_ids(conn: Connection):
+    # Earlier re-syncs stored the same EventKit event several times. Keep the
+    # identifier on the newest copy only, then build the unique index.
+    ranked = select(
+        ScheduleEvent.id,
+        func.row_number().over(
+            partition_by=(ScheduleEvent.user_id, ScheduleEvent.ek_event_id),
+            order_by=(ScheduleEvent.created_at.desc(), ScheduleEvent.id.desc()),
+        ).label("rank"),
+    ).where(ScheduleEvent.ek_event_id.is_not(None)).subquery()
+    conn.execute(
+        update(ScheduleEvent)
+        .where(ScheduleEvent.id.in_(select(ranked.c.id).where(ranked.c.rank > 1)))
+        .values(ek_event_id=None)
+    )
+    create_indexes(conn, "ux_scheduleevent_user_id_ek_event_id")
+
+
+def _event_delta_sync(conn: Connection):
+    add_column(conn, ScheduleEvent.__table__.c.updated_at)
+    add_column(conn, ScheduleEvent.__table__.c.deleted_at)
+    conn.execute(
+        update(ScheduleEvent)
+        .where(ScheduleEvent.updated_at.is_(None))
+        .values(updated_at=ScheduleEvent.created_at)
+    )
+    create_indexes(conn, "ix_scheduleevent_user_id_updated_at")
+
+    # Start every existing calendar at version 1 so old clients get a fresh ETag
+    EventSyncState.__table__.create(conn, checkfirst=True)
+    known = select(EventSyncState.user_id)
+    conn.execute(insert(EventSyncState).from_select(
+        ["user_id", "version", "modified_at"],
+        select(ScheduleEvent.user_id, literal(1), func.max(ScheduleEvent.updated_at))
+        .where(ScheduleEvent.user_id.not_in(known))
+        .group_by(ScheduleEvent.user_id),
+    ))
+
+
+def _icon_thumbnails(conn: Connection):
+    add_column(conn, TimelinePost.__table__.c.icon_thumbnail_url)
+
+
+def _home_timelines(conn: Connection):
+    add_column(conn, TimelinePost.__table__.c.fan_out_on_read, "NOT NULL DEFAULT FALSE")
+    create_indexes(conn, "ix_timelinepost_fan_out_on_read_created_at_id")
+    HomeTimelineEntry.__table__.create(conn, checkfirst=True)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "reaction_counter_columns", _reaction_counter_columns),
+    Migration(2, "dedupe_reactions", _dedupe_reactions),
+    Migration(3, "foreign_key_and_feed_indexes", _foreign_key_and_feed_indexes),
+    Migration(4, "rebuild_reaction_counters", _rebuild_reaction_counters),
+    Migration(5, "unique_event_ek_ids", _unique_event_ek_ids),
+    Migration(6, "event_delta_sync", _event_delta_sync),
+    Migration(7, "icon_thumbnails", _icon_thumbnails),
+    Migration(8, "home_timelines", _home_timelines),
+]
+
+
+def apply_migrations(conn: Connection) -> List[Migration]:
+    _bookkeeping.create_all(conn)
+    applied = set(conn.execute(select(schema_migrations.c.version)).scalars())
+
+    pending = [m for m in MIGRATIONS if m.version not in applied]
+    for migration in pending:
+        migration.apply(conn)
+        conn.execute(insert(schema_migrations).values(
+            version=migration.version,
+            name=migration.name,
+            applied_at=datetime.utcnow(),
+        ))
+    return pending
+
+
+async def run_migrations(target: AsyncEngine = engine) -> List[Migration]:
+    # Steps are idempotent, so a run interrupted part-way is repeated on the next start
+    async with target.begin() as conn:
+        return await conn.run_sync(apply_migrations)
+
+
+async def _migrate():
+    await create_db_and_tables()
+    applied = await run_migrations()
+    await engine.dispose()
+    for migration in applied:
+        print(f"Applied {migration.version:04d} {migration.name}")
+    print(f"Schema is at version {MIGRATIONS[-1].version}.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply pending schema migrations")
+    parser.parse_args()
+    asyncio.run(_migrate())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 from typing import Optional
 from datetime import datetime
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field
 import uuid
 
@@ -52,9 +53,26 @@ class ScheduleEventBase(SQLModel):
     color_hex: Optional[str] = None
 
 class ScheduleEvent(ScheduleEventBase, table=True):
+    # Re-syncs from the phone are matched on the EventKit identifier;
+    # delta syncs scan a user's events by updated_at
+    __table_args__ = (
+        Index("ux_scheduleevent_user_id_ek_event_id", "user_id", "ek_event_id", unique=True),
+        Index("ix_scheduleevent_user_id_updated_at", "user_id", "updated_at"),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
-    user_id: uuid.UUID = Field(foreign_key="user.id")
+    user_id: uuid.UUID = Field(foreign_key="user.id", index=True)
     created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    # Tombstone: deleted events stay so delta syncs can report them
+    deleted_at: Optional[datetime] = None
+
+# Per-user calendar version, bumped on every event write. GET /v1/events
+# answers conditional requests from this row alone.
+class EventSyncState(SQLModel, table=True):
+    user_id: uuid.UUID = Field(primary_key=True, foreign_key="user.id")
+    version: int = 0
+    modified_at: datetime = Field(default_factory=datetime.utcnow)
 
 class UserProfileBase(SQLModel):
     encoded_preferences: str
@@ -71,11 +89,31 @@ class TimelinePostBase(SQLModel):
     color_hex: Optional[str] = None
 
 class TimelinePost(TimelinePostBase, table=True):
+    # Keyset pagination for the feed seeks on (created_at, id)
+    __table_args__ = (
+        Index("ix_timelinepost_created_at_id", "created_at", "id"),
+        # Posts merged into home timelines at read time (high-fanout authors)
+        Index("ix_timelinepost_fan_out_on_read_created_at_id", "fan_out_on_read", "created_at", "id"),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
-    user_id: uuid.UUID = Field(foreign_key="user.id")
-    event_id: uuid.UUID = Field(foreign_key="scheduleevent.id")
+    user_id: uuid.UUID = Field(foreign_key="user.id", index=True)
+    event_id: uuid.UUID = Field(foreign_key="scheduleevent.id", index=True)
+    # created_at is served by the leading column of ix_timelinepost_created_at_id
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+    # Small pre-sized copy of icon_url for the feed; None when unavailable
+    icon_thumbnail_url: Optional[str] = None
+    # Set when the author's audience was too large to fan the post out on write
+    fan_out_on_read: bool = Field(default=False)
+
+    # Denormalized reaction counters, kept in step by the reaction endpoints
+    like_count: int = Field(default=0)
+    point_count: int = Field(default=0)
+    thumbs_up_count: int = Field(default=0)
+    hand_count: int = Field(default=0)
+    pinch_count: int = Field(default=0)
+
 # ==========================================
 # Pydantic / Response Models (DTOs)
 # Matching Swift structs
@@ -93,6 +131,8 @@ class ScheduleEventRead(ScheduleEventBase):
     id: uuid.UUID
     user_id: uuid.UUID
     created_at: datetime
+    updated_at: datetime
+    deleted_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
@@ -108,6 +148,12 @@ class ScheduleEventUpdate(SQLModel):
     is_ai_generated: Optional[bool] = None
     ek_event_id: Optional[str] = None
 
+# Per-item outcome of POST /v1/events/batch, in request order
+class ScheduleEventBatchResult(SQLModel):
+    index: int
+    id: uuid.UUID
+    status: str
+
 # Matching Swift: UserProfile
 class UserProfileRead(UserProfileBase):
     user_id: uuid.UUID
@@ -119,21 +165,71 @@ class TimelinePostRead(TimelinePostBase):
     user_id: uuid.UUID
     event_id: uuid.UUID
     created_at: datetime
+    icon_thumbnail_url: Optional[str] = None
 
 class TimelinePostCreate(TimelinePostBase):
     event_id: uuid.UUID
 
+# reaction_type -> TimelinePost counter column
+REACTION_COUNT_COLUMNS = {
+    "point": "point_count",
+    "thumbsUp": "thumbs_up_count",
+    "hand": "hand_count",
+    "pinch": "pinch_count",
+}
+
 class TimelineReaction(SQLModel, table=True):
+    # One reaction per user and post; post_id leads so per-post lookups use it too
+    __table_args__ = (
+        Index("ux_timelinereaction_post_id_user_id", "post_id", "user_id", unique=True),
+    )
+
     id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
-    user_id: uuid.UUID = Field(foreign_key="user.id")
+    user_id: uuid.UUID = Field(foreign_key="user.id", index=True)
     post_id: uuid.UUID = Field(foreign_key="timelinepost.id")
     reaction_type: str
     created_at: datetime = Field(default_factory=datetime.utcnow)
 
+# Materialized home timeline: one row per (reader, post), written when a post
+# is fanned out. created_at copies the post's so a page is one range scan.
+class HomeTimelineEntry(SQLModel, table=True):
+    __table_args__ = (
+        Index("ix_hometimelineentry_user_id_created_at_post_id", "user_id", "created_at", "post_id"),
+    )
+
+    user_id: uuid.UUID = Field(foreign_key="user.id", primary_key=True)
+    post_id: uuid.UUID = Field(foreign_key="timelinepost.id", primary_key=True, index=True)
+    created_at: datetime
+
+# Persisted queue for work that runs after the response (see src/jobs.py)
+class BackgroundJob(SQLModel, table=True):
+    # Workers claim the oldest due job
+    __table_args__ = (Index("ix_backgroundjob_status_run_after", "status", "run_after"),)
+
+    id: uuid.UUID = Field(default_factory=uuid.uuid4, primary_key=True)
+    kind: str
+    payload: str = "{}"  # JSON
+    status: str = "pending"  # pending | running | failed
+    attempts: int = 0
+    max_attempts: int = 5
+    run_after: datetime = Field(default_factory=datetime.utcnow)
+    # A running job whose lease ran out (worker died) is picked up again
+    locked_until: Optional[datetime] = None
+    last_error: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+# Per-type reaction breakdown shown in the feed
+class ReactionCounts(SQLModel):
+    point: int = 0
+    thumbsUp: int = 0
+    hand: int = 0
+    pinch: int = 0
+
 class TimelineFeedResponse(SQLModel):
     post: TimelinePostRead
     user: UserRead
     likes: int
+    reactions: ReactionCounts = Field(default_factory=ReactionCounts)
     my_reaction: Optional[str] = None
 
 # Re-update forward refs for nested models
@@ -0,0 +1,189 @@
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Set
+from fastapi.encoders import jsonable_encoder
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # redis is optional; only needed for PUBSUB_BACKEND=redis
+    aioredis = None
+
+# local: fan-out to streams in this process only. redis: every replica (and
+# every worker process) relays the shared channel to its own streams.
+PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "local")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Messages buffered per connected client before it is told to resync
+STREAM_QUEUE_SIZE = int(os.getenv("STREAM_QUEUE_SIZE", "100"))
+# Idle streams send a comment this often so proxies keep them open
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("STREAM_HEARTBEAT_SECONDS", "15"))
+# Wait before resubscribing after the Redis connection drops, doubled per failed attempt
+PUBSUB_RECONNECT_SECONDS = float(os.getenv("PUBSUB_RECONNECT_SECONDS", "0.5"))
+PUBSUB_RECONNECT_MAX_SECONDS = float(os.getenv("PUBSUB_RECONNECT_MAX_SECONDS", "30"))
+
+TIMELINE_CHANNEL = "timeline"
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    def __init__(self, maxsize: int = STREAM_QUEUE_SIZE):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        # Set when messages were dropped because the client fell behind
+        self.lost = False
+
+    def deliver(self, message: Dict[str, Any]):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.lost = True
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LocalBroker:
+    def __init__(self, queue_size: int = STREAM_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.subscriptions: Dict[str, Set[Subscription]] = defaultdict(set)
+
+    def fan_out(self, channel: str, message: Dict[str, Any]):
+        for subscription in list(self.subscriptions.get(channel, ())):
+            subscription.deliver(message)
+
+    # Tells every stream in this process to refetch, e.g. after messages may have been missed
+    def resync_all(self):
+        for channel in list(self.subscriptions):
+            self.fan_out(channel, {"type": "resync"})
+
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        self.fan_out(channel, message)
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str) -> AsyncIterator[Subscription]:
+        subscription = Subscription(self.queue_size)
+        self.subscriptions[channel].add(subscription)
+        try:
+            yield subscription
+        finally:
+            self.subscriptions[channel].discard(subscription)
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+# Publishes through Redis and relays everything it receives to the local
+# subscribers, so a post on one replica reaches streams on all of them.
+class RedisBroker(LocalBroker):
+    def __init__(
+        self,
+        url: str = REDIS_URL,
+        prefix: str = "pubsub",
+        queue_size: int = STREAM_QUEUE_SIZE,
+        reconnect_delay: float = PUBSUB_RECONNECT_SECONDS,
+        reconnect_max_delay: float = PUBSUB_RECONNECT_MAX_SECONDS,
+    ):
+        if aioredis is None:
+            raise RuntimeError("PUBSUB_BACKEND=redis needs the redis package")
+        super().__init__(queue_size)
+        self.redis = aioredis.from_url(url)
+        self.prefix = prefix
+        self.reconnect_delay = reconnect_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        self._relay: Optional[asyncio.Task] = None
+        # Set while the relay is down; the next successful subscribe resyncs streams
+        self._reconnecting = False
+        self._delay = reconnect_delay
+
+    async def publish(self, channel: str, message: Dict[str, Any]):
+        await self.redis.publish(f"{self.prefix}:{channel}", json.dumps(message, default=str))
+
+    async def _relay_messages(self):
+        pubsub = self.redis.pubsub()
+        try:
+            await pubsub.psubscribe(f"{self.prefix}:*")
+            if self._reconnecting:
+                # Whatever was published while we were away is gone
+                logger.info("Resubscribed to Redis pub/sub")
+                self._reconnecting = False
+                self.resync_all()
+            self._delay = self.reconnect_delay
+            async for raw in pubsub.listen():
+                if raw["type"] != "pmessage":
+                    continue
+                channel = raw["channel"].decode().split(":", 1)[1]
+                self.fan_out(channel, json.loads(raw["data"]))
+        finally:
+            await pubsub.aclose()
+
+    # Relays until cancelled; a dropped connection is retried with backoff
+    async def _listen(self):
+        while True:
+            try:
+                await self._relay_messages()
+                logger.warning("Redis pub/sub connection closed; resubscribing in %.1fs", self._delay)
+            except Exception:
+                logger.exception("Redis pub/sub relay failed; resubscribing in %.1fs", self._delay)
+            self._reconnecting = True
+            await asyncio.sleep(self._delay)
+            self._delay = min(self._delay * 2, self.reconnect_max_delay)
+
+    async def start(self):
+        if self._relay is None:
+            self._relay = asyncio.create_task(self._listen())
+
+    async def close(self):
+        if self._relay is not None:
+            self._relay.cancel()
+            self._relay = None
+        await self.redis.aclose()
+
+
+PUBSUB_BACKENDS = {
+    "local": LocalBroker,
+    "redis": RedisBroker,
+}
+
+
+def build_broker(backend: str = PUBSUB_BACKEND) -> LocalBroker:
+    try:
+        return PUBSUB_BACKENDS[backend]()
+    except KeyError:
+        raise ValueError(f"Unknown PUBSUB_BACKEND {backend!r}, expected one of {', '.join(PUBSUB_BACKENDS)}")
+
+
+broker = build_broker()
+
+
+async def publish_timeline(event_type: str, **data: Any):
+    await broker.publish(TIMELINE_CHANNEL, {"type": event_type, **jsonable_encoder(data)})
+
+
+def sse_message(message: Dict[str, Any]) -> str:
+    return f"event: {message['type']}\ndata: {json.dumps(message)}\n\n"
+
+
+# Server-Sent Events body for one client. The subscription is dropped when
+# the client disconnects and Starlette cancels the generator.
+async def sse_events(channel: str, heartbeat: float = STREAM_HEARTBEAT_SECONDS) -> AsyncIterator[str]:
+    async with broker.subscribe(channel) as subscription:
+        yield "retry: 3000\n\n"
+        while True:
+            if subscription.lost:
+                # Deltas were dropped; the client should refetch the first page
+                subscription.lost = False
+                yield sse_message({"type": "resync"})
+            message = await subscription.get(timeout=heartbeat)
+            if message is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield sse_message(message)
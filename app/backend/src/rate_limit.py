@@ -0,0 +1,55 @@
+import math
+import time
+from typing import Hashable, Optional
+from fastapi import HTTPException, status
+from src.cache import TTLCache
+
+
+class RateLimiter:
+    """Fixed-window counter per key, kept in this process.
+
+    With several workers or replicas each one counts on its own, so the
+    effective limit is the configured one times the number of processes.
+    """
+
+    def __init__(self, limit: int, window: float, maxsize: int = 100000):
+        self.limit = limit
+        self.window = window
+        self.rejected = 0
+        # key -> [window start, count]
+        self._windows = TTLCache(maxsize=maxsize, ttl=window)
+
+    # Seconds until `key` may try again, or None while attempts are left
+    def retry_after(self, key: Hashable) -> Optional[int]:
+        entry = self._windows.get(key)
+        if entry is None or entry[1] < self.limit:
+            return None
+        return max(1, math.ceil(entry[0] + self.window - time.monotonic()))
+
+    def hit(self, key: Hashable):
+        entry = self._windows.get(key)
+        if entry is None:
+            self._windows.set(key, [time.monotonic(), 1])
+        else:
+            entry[1] += 1
+
+    def check(self, key: Hashable):
+        retry_after = self.retry_after(key)
+        if retry_after is not None:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests",
+                headers={"Retry-After": str(retry_after)},
+            )
+
+    # Rejects the attempt if the key has used up its window, otherwise counts it
+    def check_and_hit(self, key: Hashable):
+        self.check(key)
+        self.hit(key)
+
+    def reset(self, key: Hashable):
+        self._windows.pop(key)
+
+    def clear(self):
+        self._windows.clear()
@@ -0,0 +1,166 @@
+import argparse
+import asyncio
+import uuid
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import case, delete, func, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from src.db import async_session_maker, dialect_insert, engine
+from src.models import REACTION_COUNT_COLUMNS, TimelinePost, TimelineReaction
+
+
+def _counter(reaction_type: str):
+    return getattr(TimelinePost, REACTION_COUNT_COLUMNS[reaction_type])
+
+
+# On PostgreSQL every reaction write locks the post row first, so the user's
+# previous reaction can be read without racing another tap and the counters
+# are moved by deltas. SQLite has no row locks but only one writer: the first
+# write of a transaction holds the database lock until commit.
+async def _lock_post(db: AsyncSession, post_id: uuid.UUID) -> bool:
+    result = await db.execute(select(TimelinePost.id).where(TimelinePost.id == post_id).with_for_update())
+    return result.scalar_one_or_none() is not None
+
+
+# Moves the post's counters by one reaction inside the caller's transaction
+async def adjust_reaction_counters(
+    db: AsyncSession,
+    post_id: uuid.UUID,
+    added: str | None = None,
+    removed: str | None = None,
+):
+    values = {}
+    if added is not None:
+        values[_counter(added)] = _counter(added) + 1
+    if removed is not None:
+        values[_counter(removed)] = _counter(removed) - 1
+    if (added is None) != (removed is None):
+        values[TimelinePost.like_count] = TimelinePost.like_count + (1 if added else -1)
+    if values:
+        await db.execute(update(TimelinePost).where(TimelinePost.id == post_id).values(values))
+
+
+def _count_reactions(reaction_type: str | None = None):
+    stmt = (
+        select(func.count(TimelineReaction.id))
+        .where(TimelineReaction.post_id == TimelinePost.id)
+        .correlate(TimelinePost)
+    )
+    if reaction_type is not None:
+        stmt = stmt.where(TimelineReaction.reaction_type == reaction_type)
+    return stmt.scalar_subquery()
+
+
+def reaction_counter_values():
+    values = {TimelinePost.like_count: _count_reactions()}
+    for reaction_type in REACTION_COUNT_COLUMNS:
+        values[_counter(reaction_type)] = _count_reactions(reaction_type)
+    return values
+
+
+# Recomputes one post's counters from its reaction rows (served by the
+# post_id-leading unique index). Returns False when the post does not exist.
+async def refresh_reaction_counters(db: AsyncSession, post_id: uuid.UUID) -> bool:
+    result = await db.execute(
+        update(TimelinePost).where(TimelinePost.id == post_id).values(reaction_counter_values())
+    )
+    return result.rowcount > 0
+
+
+# Recomputes every post's counters from the reactions table
+async def rebuild_reaction_counters(db: AsyncSession) -> int:
+    result = await db.execute(update(TimelinePost).values(reaction_counter_values()))
+    await db.commit()
+    return result.rowcount
+
+
+# Adds or changes the user's reaction in two statements. Returns False when
+# the post does not exist.
+async def set_reaction(
+    db: AsyncSession, user_id: uuid.UUID, post_id: uuid.UUID, reaction_type: str
+) -> bool:
+    insert = dialect_insert(db, TimelineReaction).values(
+        id=uuid.uuid4(),
+        user_id=user_id,
+        post_id=post_id,
+        reaction_type=reaction_type,
+        created_at=datetime.utcnow(),
+    )
+    upsert = insert.on_conflict_do_update(
+        index_elements=["post_id", "user_id"],
+        set_={"reaction_type": insert.excluded.reaction_type},
+        where=TimelineReaction.reaction_type != insert.excluded.reaction_type,
+    )
+    if db.bind.dialect.name == "sqlite":
+        # The upsert takes the write lock, so no other tap can commit before
+        # the counters are recounted from the rows
+        await db.execute(upsert)
+        return await refresh_reaction_counters(db, post_id)
+
+    if not await _lock_post(db, post_id):
+        return False
+    # One statement reads the previous type (its snapshot starts after the
+    # lock), runs the upsert in a CTE and moves the counters by the difference
+    previous = (
+        select(TimelineReaction.reaction_type)
+        .where(TimelineReaction.post_id == post_id, TimelineReaction.user_id == user_id)
+        .cte("previous")
+    )
+    previous_type = select(previous.c.reaction_type).scalar_subquery()
+    values = {
+        _counter(name): _counter(name)
+        + (1 if name == reaction_type else 0)
+        - case((previous_type == name, 1), else_=0)
+        for name in REACTION_COUNT_COLUMNS
+    }
+    values[TimelinePost.like_count] = TimelinePost.like_count + case((previous_type.is_(None), 1), else_=0)
+    await db.execute(
+        update(TimelinePost)
+        .where(TimelinePost.id == post_id)
+        .values(values)
+        .add_cte(previous)
+        .add_cte(upsert.cte("upserted"))
+    )
+    return True
+
+
+# Deletes the user's reaction with a single DELETE ... RETURNING and moves
+# the counters by the removed type. Returns that type, or None.
+async def clear_reaction(
+    db: AsyncSession, user_id: uuid.UUID, post_id: uuid.UUID
+) -> Optional[str]:
+    if db.bind.dialect.name != "sqlite" and not await _lock_post(db, post_id):
+        return None
+    result = await db.execute(
+        delete(TimelineReaction)
+        .where(TimelineReaction.post_id == post_id, TimelineReaction.user_id == user_id)
+        .returning(TimelineReaction.reaction_type)
+    )
+    removed = result.scalars().first()
+    if removed is not None:
+        await adjust_reaction_counters(db, post_id, removed=removed)
+    return removed
+
+
+async def _repair():
+    async with async_session_maker() as session:
+        rows = await rebuild_reaction_counters(session)
+    await engine.dispose()
+    print(f"Rebuilt reaction counters for {rows} posts.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Timeline reaction maintenance")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser("rebuild-counters", help="Rebuild TimelinePost counters from TimelineReaction")
+    args = parser.parse_args()
+
+    if args.command == "rebuild-counters":
+        asyncio.run(_repair())
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,70 +1,177 @@
-from typing import List
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import List, Optional
+import logging
 import uuid
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from src.db import get_async_session
-from src.models import ScheduleEvent, ScheduleEventCreate, ScheduleEventRead, ScheduleEventUpdate, User, TimelinePost
-from src.auth import current_active_user
+from src.feed_cache import feed_cache
+from src.pubsub import publish_timeline
+from src.event_sync import snapshot, sync_events, sync_linked_posts, touch_calendar
+from src.models import (
+    EventSyncState, ScheduleEvent, ScheduleEventBatchResult, ScheduleEventCreate, ScheduleEventRead,
+    ScheduleEventUpdate, User
+)
+from src.auth import current_hot_user
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
+
+EVENT_BATCH_MAX = 1000
+
+def _http_date(value: datetime) -> str:
+    return format_datetime(value.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+
+# HTTP dates have whole seconds: until the second modified_at falls in is over,
+# another change can land in it with the same Last-Modified. Such a date is
+# neither sent nor trusted in If-Modified-Since (the ETag still works).
+def _last_modified_settled(modified_at: datetime, now: datetime) -> bool:
+    return modified_at.replace(microsecond=0) + timedelta(seconds=1) <= now
+
+
+def _not_modified(request: Request, etag: str, modified_at: datetime, now: datetime) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None and _last_modified_settled(modified_at, now):
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return modified_at.replace(tzinfo=timezone.utc, microsecond=0) <= since
+    return False
+
 
 @router.get("/", response_model=List[ScheduleEventRead])
 async def get_events(
+    request: Request,
+    response: Response,
+    updated_since: Optional[datetime] = Query(None, description="Only events changed after this time, including tombstones of deleted ones"),
+    start: Optional[datetime] = Query(None, description="Only events ending after this time"),
+    end: Optional[datetime] = Query(None, description="Only events starting before this time"),
     db: AsyncSession = Depends(get_async_session),
-    user: User = Depends(current_active_user)
+    user: User = Depends(current_hot_user)
 ):
-    result = await db.execute(select(ScheduleEvent).where(ScheduleEvent.user_id == user.id))
+    # Conditional GET: a primary-key lookup instead of scanning the calendar
+    state = await db.get(EventSyncState, user.id)
+    version, modified_at = (state.version, state.modified_at) if state else (0, user.created_at)
+    etag = f'W/"events-{version}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+    }
+    now = datetime.utcnow()
+    if _last_modified_settled(modified_at, now):
+        headers["Last-Modified"] = _http_date(modified_at)
+    if _not_modified(request, etag, modified_at, now):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+
+    stmt = select(ScheduleEvent).where(ScheduleEvent.user_id == user.id)
+    if updated_since is not None:
+        stmt = stmt.where(ScheduleEvent.updated_at > updated_since.replace(tzinfo=None))
+    else:
+        stmt = stmt.where(ScheduleEvent.deleted_at.is_(None))
+    if start is not None:
+        stmt = stmt.where(ScheduleEvent.end_date > start.replace(tzinfo=None))
+    if end is not None:
+        stmt = stmt.where(ScheduleEvent.start_date < end.replace(tzinfo=None))
+
+    result = await db.execute(stmt)
     return result.scalars().all()
 
+@asynccontextmanager
+async def ek_event_id_conflicts(db: AsyncSession):
+    try:
+        yield
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="An event with this ek_event_id already exists")
+
 @router.post("/", response_model=ScheduleEventRead, status_code=status.HTTP_201_CREATED)
 async def create_event(
     event: ScheduleEventCreate,
+    upsert: bool = Query(True, description="Update the event with the same ek_event_id instead of conflicting"),
     db: AsyncSession = Depends(get_async_session),
-    user: User = Depends(current_active_user)
+    user: User = Depends(current_hot_user)
 ):
-    print(f"DEBUG: Receiving event sync: title={event.title}, start_date={event.start_date}, is_ai={event.is_ai_generated}")
-    db_event = ScheduleEvent(**event.model_dump(), user_id=user.id)
-    db.add(db_event)
-    
-    # Auto-post to timeline if AI generated
-    if db_event.is_ai_generated:
-        # Default content for now. In future, we could generate this description too.
-        content = f"{db_event.title}"
-        timeline_post = TimelinePost(
-            user_id=user.id,
-            event_id=db_event.id,
-            content=content,
-            category=db_event.category,
-            event_date=db_event.start_date.strftime("%Y/%m/%d"),
-            color_hex=db_event.color_hex
-        )
-        print(f"DEBUG: Extracted event_date: {timeline_post.event_date}")
-        db.add(timeline_post)
-        
-    await db.commit()
-    await db.refresh(db_event)
+    logger.debug("Receiving event sync", extra={
+        "title": event.title, "start_date": event.start_date, "is_ai": event.is_ai_generated,
+    })
+    # Auto-posts to timeline if AI generated
+    async with ek_event_id_conflicts(db):
+        [(db_event, outcome)] = await sync_events(db, user.id, [event], upsert=upsert)
+        await db.commit()
+    if outcome != "unchanged":
+        # Auto posts and linked post edits show up in the shared feed
+        await feed_cache.invalidate()
+        await publish_timeline("timeline.changed")
     return db_event
 
+# EventKit bulk sync: one auth check, one transaction, multi-row INSERTs
+@router.post("/batch", response_model=List[ScheduleEventBatchResult], status_code=status.HTTP_201_CREATED)
+async def create_events_batch(
+    events: List[ScheduleEventCreate],
+    upsert: bool = Query(True, description="Update events with the same ek_event_id instead of conflicting"),
+    db: AsyncSession = Depends(get_async_session),
+    user: User = Depends(current_hot_user)
+):
+    if len(events) > EVENT_BATCH_MAX:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {EVENT_BATCH_MAX} events per batch",
+        )
+    if not events:
+        return []
+
+    async with ek_event_id_conflicts(db):
+        outcomes = await sync_events(db, user.id, events, upsert=upsert)
+        await db.commit()
+    if any(outcome != "unchanged" for _, outcome in outcomes):
+        await feed_cache.invalidate()
+        await publish_timeline("timeline.changed")
+
+    return [
+        ScheduleEventBatchResult(index=i, id=db_event.id, status=outcome)
+        for i, (db_event, outcome) in enumerate(outcomes)
+    ]
+
 @router.put("/{event_id}", response_model=ScheduleEventRead)
 async def update_event(
     event_id: uuid.UUID,
     event_update: ScheduleEventUpdate,
     db: AsyncSession = Depends(get_async_session),
-    user: User = Depends(current_active_user)
+    user: User = Depends(current_hot_user)
 ):
-    result = await db.execute(select(ScheduleEvent).where(ScheduleEvent.id == event_id, ScheduleEvent.user_id == user.id))
+    result = await db.execute(select(ScheduleEvent).where(
+        ScheduleEvent.id == event_id,
+        ScheduleEvent.user_id == user.id,
+        ScheduleEvent.deleted_at.is_(None)
+    ))
     db_event = result.scalars().first()
     
     if not db_event:
         raise HTTPException(status_code=404, detail="Event not found")
     
+    before = snapshot(db_event)
     event_data = event_update.dict(exclude_unset=True)
     for key, value in event_data.items():
         setattr(db_event, key, value)
+    db_event.updated_at = datetime.utcnow()
         
     db.add(db_event)
-    await db.commit()
+    async with ek_event_id_conflicts(db):
+        await sync_linked_posts(db, [before])
+        await touch_calendar(db, user.id)
+        await db.commit()
+    await feed_cache.invalidate()
+    await publish_timeline("timeline.changed")
     await db.refresh(db_event)
     return db_event
 
@@ -72,13 +179,19 @@ async def update_event(
 async def delete_event(
     event_id: uuid.UUID,
     db: AsyncSession = Depends(get_async_session),
-    user: User = Depends(current_active_user)
+    user: User = Depends(current_hot_user)
 ):
-    result = await db.execute(select(ScheduleEvent).where(ScheduleEvent.id == event_id, ScheduleEvent.user_id == user.id))
+    result = await db.execute(select(ScheduleEvent).where(
+        ScheduleEvent.id == event_id,
+        ScheduleEvent.user_id == user.id,
+        ScheduleEvent.deleted_at.is_(None)
+    ))
     db_event = result.scalars().first()
     
     if not db_event:
         raise HTTPException(status_code=404, detail="Event not found")
         
-    await db.delete(db_event)
+    # Keep a tombstone so delta syncs on other devices learn about the delete
+    db_event.deleted_at = db_event.updated_at = datetime.utcnow()
+    await touch_calendar(db, user.id)
     await db.commit()
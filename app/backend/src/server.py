@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import os
+import uvicorn
+from src.db import create_db_and_tables, engine
+from src.feed_cache import FEED_CACHE_BACKEND
+from src.migrations import run_migrations
+from src.observability import configure_logging
+from src.pubsub import PUBSUB_BACKEND
+from src.storage import STORAGE_DIR
+
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "1"))
+# After SIGTERM, in-flight requests get this long before they are cut off.
+# Keep it below the pod's terminationGracePeriodSeconds.
+SERVER_GRACEFUL_TIMEOUT = int(os.getenv("SERVER_GRACEFUL_TIMEOUT", "20"))
+# Idle keep-alive; uvicorn's default of 5s makes clients polling the feed reconnect every time
+SERVER_KEEP_ALIVE = int(os.getenv("SERVER_KEEP_ALIVE", "30"))
+# Pending connections the kernel queues while every worker is busy
+SERVER_BACKLOG = int(os.getenv("SERVER_BACKLOG", "2048"))
+# Proxies whose X-Forwarded-For is trusted for the client address (comma-separated
+# IPs/CIDRs, "*" for any). The per-IP auth limits key on that address, so behind
+# an ingress or proxy this must list it, or every client looks like the proxy.
+FORWARDED_ALLOW_IPS = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+# Set by serve() once the startup work below is done, so workers skip it
+PREPARED_ENV = "APP_PREPARED"
+
+logger = logging.getLogger(__name__)
+
+
+# One-time startup work: schema, migrations, storage directories
+async def prepare():
+    os.makedirs(os.path.join(STORAGE_DIR, "icons"), exist_ok=True)
+    await create_db_and_tables()
+    await run_migrations()
+
+
+def prepared() -> bool:
+    return os.getenv(PREPARED_ENV) == "1"
+
+
+async def _prepare_once():
+    await prepare()
+    # Workers open their own connections
+    await engine.dispose()
+
+
+def serve(workers: int = WEB_WORKERS):
+    # Streams would only see posts made through their own worker
+    if workers > 1 and PUBSUB_BACKEND == "local":
+        raise RuntimeError("WEB_WORKERS > 1 needs PUBSUB_BACKEND=redis; the local broker only reaches one process")
+
+    configure_logging()
+    asyncio.run(_prepare_once())
+    os.environ[PREPARED_ENV] = "1"
+
+    # Keeps its state inside one process; other workers won't see it
+    if workers > 1 and FEED_CACHE_BACKEND == "memory":
+        logger.warning("FEED_CACHE_BACKEND=memory: a worker can serve pages invalidated on another "
+                       "for up to FEED_CACHE_TTL_SECONDS")
+
+    uvicorn.run(
+        "main:app",
+        host=SERVER_HOST,
+        port=SERVER_PORT,
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+        timeout_graceful_shutdown=SERVER_GRACEFUL_TIMEOUT,
+        timeout_keep_alive=SERVER_KEEP_ALIVE,
+        backlog=SERVER_BACKLOG,
+        proxy_headers=True,
+        forwarded_allow_ips=FORWARDED_ALLOW_IPS,
+        # Keep the JSON logging set up by configure_logging()
+        log_config=None,
+    )
+
+
+if __name__ == "__main__":
+    serve()
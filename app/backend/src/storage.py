@@ -0,0 +1,127 @@
+import os
+import re
+from abc import ABC, abstractmethod
+import shutil
+import tempfile
+from typing import Dict, Type
+from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse
+from starlette.types import Scope
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "local")
+STORAGE_DIR = os.getenv("STORAGE_DIR", "storage")
+# Where clients fetch stored objects from, e.g. a CDN in front of the bucket.
+# The local backend is served by main.py under /storage.
+STORAGE_PUBLIC_URL = os.getenv("STORAGE_PUBLIC_URL", "/storage").rstrip("/")
+
+# Content-addressed names never change content, so they can be cached for good
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+CONTENT_HASHED_NAME = re.compile(r"^(?P<digest>[0-9a-f]{32,64})(_\w+)?\.\w+$")
+
+
+class Storage(ABC):
+    """Where uploaded files end up. Keys are slash-separated relative paths."""
+
+    def __init__(self, public_url: str = STORAGE_PUBLIC_URL):
+        self.public_url = public_url
+
+    def url(self, key: str) -> str:
+        return f"{self.public_url}/{key}"
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        ...
+
+    # Takes ownership of the local file at source_path
+    @abstractmethod
+    async def put(self, key: str, source_path: str, content_type: str):
+        ...
+
+    # Copies the object to a local file, e.g. for post-processing
+    @abstractmethod
+    async def fetch(self, key: str, target_path: str):
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str):
+        ...
+
+
+class LocalStorage(Storage):
+    def __init__(self, root: str = STORAGE_DIR, public_url: str = STORAGE_PUBLIC_URL):
+        super().__init__(public_url)
+        self.root = root
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    async def exists(self, key: str) -> bool:
+        return await run_in_threadpool(os.path.exists, self.path(key))
+
+    async def put(self, key: str, source_path: str, content_type: str):
+        await run_in_threadpool(self._put, source_path, self.path(key))
+
+    @staticmethod
+    def _put(source_path: str, target: str):
+        # Objects are served as immutable, so a reader must never see a partial
+        # file. The staging dir may be on another filesystem, where move is a
+        # copy: copy into a temp file next to the target, then rename it.
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".part")
+        os.close(fd)
+        try:
+            shutil.move(source_path, tmp_path)
+            os.replace(tmp_path, target)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    async def fetch(self, key: str, target_path: str):
+        await run_in_threadpool(shutil.copyfile, self.path(key), target_path)
+
+    async def delete(self, key: str):
+        try:
+            await run_in_threadpool(os.unlink, self.path(key))
+        except FileNotFoundError:
+            pass
+
+
+# An object store backend (S3, GCS, ...) registers here with the same interface
+STORAGE_BACKENDS: Dict[str, Type[Storage]] = {
+    "local": LocalStorage,
+}
+
+
+def build_storage(backend: str = STORAGE_BACKEND) -> Storage:
+    try:
+        return STORAGE_BACKENDS[backend]()
+    except KeyError:
+        raise ValueError(f"Unknown STORAGE_BACKEND {backend!r}, expected one of {', '.join(STORAGE_BACKENDS)}")
+
+
+storage = build_storage()
+
+
+class CachedStaticFiles(StaticFiles):
+    """StaticFiles that lets clients cache content-hashed files forever.
+
+    Hashed names get the digest as a strong ETag (stable across replicas) and an
+    immutable Cache-Control; anything else (e.g. icons uploaded before names were
+    hashed) must be revalidated.
+    """
+
+    def file_response(self, full_path, stat_result, scope: Scope, status_code: int = 200) -> Response:
+        match = CONTENT_HASHED_NAME.match(os.path.basename(full_path))
+        if match:
+            headers = {"etag": f'"{match.group(0)}"', "cache-control": IMMUTABLE_CACHE_CONTROL}
+        else:
+            headers = {"cache-control": "no-cache"}
+
+        response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, headers=headers)
+        if self.is_not_modified(response.headers, Headers(scope=scope)):
+            return NotModifiedResponse(response.headers)
+        return response
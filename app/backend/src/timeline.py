@@ -1,62 +1,63 @@
 import uuid
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status, Query, File, UploadFile
-from sqlalchemy import func
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Query, File, UploadFile, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from src.db import get_async_session
+from src.reactions import clear_reaction, set_reaction
+from src.icons import ICON_EXTENSIONS, ICON_MAX_BYTES, IconTooLarge, UnsupportedIconType, save_icon, schedule_thumbnail
+from src.feed import InvalidCursor, decode_cursor, encode_cursor, reaction_counts
+from src.pubsub import TIMELINE_CHANNEL, publish_timeline, sse_events
+from src.feed_cache import feed_cache
+from src.home_timeline import fan_out_enabled, fan_out_posts, fetch_home_feed, remove_from_home_timelines
 from src.models import (
     TimelinePost, TimelinePostCreate, TimelinePostRead, 
-    TimelineReaction, TimelineFeedResponse, User
+    TimelineFeedResponse, User, UserRead
 )
-import os
-import shutil
-from src.auth import current_active_user
+from src.auth import current_active_user, current_hot_user, current_superuser
 
 router = APIRouter()
 
+
+# Pushes the post's current counters to stream clients after a reaction commit
+async def publish_reactions(db: AsyncSession, post_id: uuid.UUID):
+    db_post = await db.get(TimelinePost, post_id, populate_existing=True)
+    if db_post is not None:
+        await publish_timeline(
+            "post.reactions",
+            post_id=post_id,
+            likes=db_post.like_count,
+            reactions=reaction_counts(db_post),
+        )
+
+
 # 1. 投稿を取得（タイムライン表示） - ページネーション & リアクション付き
 @router.get("/posts", response_model=List[TimelineFeedResponse])
 async def get_timeline(
+    response: Response,
     limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Opaque cursor from the X-Next-Cursor header; takes precedence over offset"),
     db: AsyncSession = Depends(get_async_session),
-    user: User = Depends(current_active_user)
+    user: User = Depends(current_hot_user)
 ):
-    # Query: TimelinePost + User (Author)
-    stmt = (
-        select(TimelinePost, User)
-        .join(User, TimelinePost.user_id == User.id)
-        .order_by(TimelinePost.created_at.desc())
-        .offset(offset)
-        .limit(limit)
-    )
-    result = await db.execute(stmt)
-    posts_with_users = result.all() # [(TimelinePost, User), ...]
-    
-    response = []
-    for post, author in posts_with_users:
-        # Get Like Count
-        likes_count_stmt = select(func.count(TimelineReaction.id)).where(TimelineReaction.post_id == post.id)
-        likes_count_res = await db.execute(likes_count_stmt)
-        likes_count = likes_count_res.scalar() or 0
-        
-        # Get My Reaction
-        my_reaction_stmt = select(TimelineReaction.reaction_type).where(
-            TimelineReaction.post_id == post.id,
-            TimelineReaction.user_id == user.id
-        )
-        my_reaction_res = await db.execute(my_reaction_stmt)
-        my_reaction = my_reaction_res.scalar_one_or_none()
-        
-        response.append(TimelineFeedResponse(
-            post=post,
-            user=author,
-            likes=likes_count,
-            my_reaction=my_reaction
-        ))
-        
-    return response
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    if fan_out_enabled():
+        # The reader's own materialized rows; nothing to share between readers
+        feed = await fetch_home_feed(db, user.id, limit=limit, offset=offset, cursor=after)
+    else:
+        # Shared page from the feed cache (one statement on a miss) plus this user's my_reaction
+        feed = await feed_cache.fetch(db, user.id, limit=limit, offset=offset, cursor=after)
+
+    # Body stays a plain list for existing clients; the next page is advertised in a header
+    if len(feed) == limit:
+        response.headers["X-Next-Cursor"] = encode_cursor(feed[-1].post)
+    return feed
 
 # 2. 新規投稿
 @router.post("/posts", response_model=TimelinePostRead)
@@ -71,8 +72,16 @@ async def create_post(
         content=post.content
     )
     db.add(db_post)
+    await fan_out_posts(db, [db_post])
     await db.commit()
+    await feed_cache.invalidate()
     await db.refresh(db_post)
+    # Same shape as a feed item so clients can insert it as is
+    await publish_timeline("post.created", item=TimelineFeedResponse(
+        post=TimelinePostRead.model_validate(db_post),
+        user=UserRead.model_validate(user),
+        likes=0,
+    ))
     return db_post
 
 # 3. 投稿の削除
@@ -91,8 +100,11 @@ async def delete_post(
     if db_post.user_id != user.id:
         raise HTTPException(status_code=403, detail="Cannot delete other user's post")
     
+    await remove_from_home_timelines(db, post_id)
     await db.delete(db_post)
     await db.commit()
+    await feed_cache.invalidate()
+    await publish_timeline("post.deleted", post_id=post_id)
 
 # 4. リアクション追加/更新
 @router.post("/posts/{post_id}/reactions", status_code=status.HTTP_200_OK)
@@ -100,26 +112,16 @@ async def react_to_post(
     post_id: uuid.UUID,
     reaction_type: str = Query(..., regex="^(point|thumbsUp|hand|pinch)$"),
     db: AsyncSession = Depends(get_async_session),
-    user: User = Depends(current_active_user)
+    user: User = Depends(current_hot_user)
 ):
-    # Check if reaction exists
-    result = await db.execute(select(TimelineReaction).where(
-        TimelineReaction.post_id == post_id,
-        TimelineReaction.user_id == user.id
-    ))
-    existing_reaction = result.scalars().first()
-    
-    if existing_reaction:
-        existing_reaction.reaction_type = reaction_type
-    else:
-        new_reaction = TimelineReaction(
-            user_id=user.id,
-            post_id=post_id,
-            reaction_type=reaction_type
-        )
-        db.add(new_reaction)
-    
+    # Upsert and counter update run in the same transaction
+    if not await set_reaction(db, user.id, post_id, reaction_type):
+        await db.rollback()
+        raise HTTPException(status_code=404, detail=f"Post {post_id} not found")
+
     await db.commit()
+    await feed_cache.invalidate()
+    await publish_reactions(db, post_id)
     return {"status": "success", "reaction": reaction_type}
 
 # 5. リアクション削除
@@ -127,17 +129,12 @@ async def react_to_post(
 async def remove_reaction(
     post_id: uuid.UUID,
     db: AsyncSession = Depends(get_async_session),
-    user: User = Depends(current_active_user)
+    user: User = Depends(current_hot_user)
 ):
-    result = await db.execute(select(TimelineReaction).where(
-        TimelineReaction.post_id == post_id,
-        TimelineReaction.user_id == user.id
-    ))
-    existing_reaction = result.scalars().first()
-    
-    if existing_reaction:
-        await db.delete(existing_reaction)
+    if await clear_reaction(db, user.id, post_id) is not None:
         await db.commit()
+        await feed_cache.invalidate()
+        await publish_reactions(db, post_id)
 
 # 6. アイコンのアップロード
 @router.post("/posts/{post_id}/icon", status_code=status.HTTP_200_OK)
@@ -157,18 +154,36 @@ async def upload_post_icon(
     if db_post.user_id != user.id:
         raise HTTPException(status_code=403, detail="Not authorized to edit this post")
     
-    # Save file
-    file_ext = os.path.splitext(file.filename)[1]
-    file_name = f"{post_id}{file_ext}"
-    file_path = f"storage/icons/{file_name}"
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # Save file (streamed off the event loop, size- and type-checked)
+    try:
+        stored = await save_icon(file)
+    except UnsupportedIconType:
+        raise HTTPException(status_code=415, detail=f"Icon must be one of {', '.join(ICON_EXTENSIONS)}")
+    except IconTooLarge:
+        raise HTTPException(status_code=413, detail=f"Icon must be at most {ICON_MAX_BYTES} bytes")
         
     # Update icon_url
-    db_post.icon_url = f"/storage/icons/{file_name}"
+    db_post.icon_url = stored.url
+    db_post.icon_thumbnail_url = stored.thumbnail_url
     db.add(db_post)
+    await schedule_thumbnail(db, post_id, stored)
     await db.commit()
+    await feed_cache.invalidate()
     await db.refresh(db_post)
+    await publish_timeline("post.updated", post=TimelinePostRead.model_validate(db_post))
     
-    return {"status": "success", "icon_url": db_post.icon_url}
\ No newline at end of file
+    return {"status": "success", "icon_url": db_post.icon_url, "icon_thumbnail_url": db_post.icon_thumbnail_url}
+
+# 7. タイムラインのリアルタイム配信 (Server-Sent Events)
+@router.get("/stream")
+async def stream_timeline(user: User = Depends(current_hot_user)):
+    return StreamingResponse(
+        sse_events(TIMELINE_CHANNEL),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# 8. フィードキャッシュの統計
+@router.get("/cache/stats")
+async def get_feed_cache_stats(user: User = Depends(current_superuser)):
+    return feed_cache.stats()
@@ -0,0 +1,49 @@
+import os
+import uuid
+from typing import Any, Dict, Optional
+from fastapi_users.db import SQLAlchemyUserDatabase
+from sqlalchemy.orm import make_transient_to_detached
+from src.cache import TTLCache
+from src.models import User
+
+# Active users by id, so authenticated requests skip the per-request user SELECT.
+# Writes through /v1/users invalidate the local entry; the TTL bounds how long
+# another replica can keep serving a user that was changed elsewhere.
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+
+user_cache = TTLCache(maxsize=USER_CACHE_MAX_ENTRIES, ttl=USER_CACHE_TTL_SECONDS)
+
+
+def invalidate_user(user_id: uuid.UUID):
+    user_cache.pop(user_id)
+
+
+class CachedUserDatabase(SQLAlchemyUserDatabase):
+    async def get(self, id: uuid.UUID) -> Optional[User]:
+        data = user_cache.get(id)
+        if data is None:
+            user = await super().get(id)
+            if user is not None and user.is_active:
+                user_cache.set(id, user.model_dump())
+            return user
+
+        # Rebuild the row as if it had been loaded, then attach it to this
+        # session without emitting SQL so later updates still work.
+        user = User(**data)
+        make_transient_to_detached(user)
+        return await self.session.merge(user, load=False)
+
+    # Invalidate on both sides of the write so a concurrent get() can't
+    # re-cache the old row in between
+    async def update(self, user: User, update_dict: Dict[str, Any]) -> User:
+        invalidate_user(user.id)
+        user = await super().update(user, update_dict)
+        invalidate_user(user.id)
+        return user
+
+    async def delete(self, user: User) -> None:
+        user_id = user.id
+        invalidate_user(user_id)
+        await super().delete(user)
+        invalidate_user(user_id)
@@ -0,0 +1,14 @@
+import os
+import tempfile
+
+# Keep the suite off the developer's ./database.db; must run before src.db is imported
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/test.db")
+os.environ.setdefault("JWT_SECRET", "test-secret")
+os.environ.setdefault("STORAGE_DIR", tempfile.mkdtemp())
+os.environ.setdefault("ICON_STAGING_DIR", tempfile.mkdtemp())
+# Every test signs up and logs in from the same TestClient address
+os.environ.setdefault("AUTH_IP_LIMIT", "100000")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "postgres: needs a Postgres database at TEST_POSTGRES_URL")
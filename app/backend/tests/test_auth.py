@@ -0,0 +1,143 @@
+import asyncio
+import json
+import uuid
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from fastapi_users.jwt import decode_jwt
+from fastapi_users.db import SQLAlchemyUserDatabase
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.future import select
+from sqlmodel import SQLModel
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import app
+import src.auth
+import src.jobs
+from src.auth import UserManager, current_user_from_claims, get_jwt_strategy
+from src.db import engine
+from src.jobs import JobQueue
+from src.models import BackgroundJob, User
+from src.schemas import UserCreate
+from src.passwords import password_helper
+
+
+def get_auth_headers(client, email):
+    password = "password123"
+    client.post("/v1/auth/register", json={
+        "email": email,
+        "password": password,
+        "username": "auth_tester"
+    })
+    login_res = client.post("/v1/auth/jwt/login", data={
+        "username": email,
+        "password": password
+    })
+    assert login_res.status_code == 200, f"Login failed: {login_res.text}"
+    return {"Authorization": f"Bearer {login_res.json()['access_token']}"}
+
+
+class UserSelects:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("SELECT") and 'FROM user' in statement:
+            self.count += 1
+
+    def __enter__(self):
+        event.listen(engine.sync_engine, "before_cursor_execute", self)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(engine.sync_engine, "before_cursor_execute", self)
+
+
+def test_user_cache_skips_lookup_and_invalidates():
+    with TestClient(app) as client:
+        headers = get_auth_headers(client, "auth_cache@example.com")
+        client.get("/v1/users/me", headers=headers)
+
+        with UserSelects() as selects:
+            res = client.get("/v1/users/me", headers=headers)
+        assert res.status_code == 200
+        assert selects.count == 0
+
+        res = client.patch("/v1/users/me", json={"username": "renamed"}, headers=headers)
+        assert res.status_code == 200
+        assert client.get("/v1/users/me", headers=headers).json()["username"] == "renamed"
+
+
+def test_claims_mode_reads_user_from_token():
+    claims_app = FastAPI()
+
+    @claims_app.get("/whoami")
+    async def whoami(user: User = Depends(current_user_from_claims)):
+        return {"id": str(user.id), "username": user.username}
+
+    with TestClient(app) as client:
+        headers = get_auth_headers(client, "auth_claims@example.com")
+        me = client.get("/v1/users/me", headers=headers).json()
+
+    with TestClient(claims_app) as client, UserSelects() as selects:
+        res = client.get("/whoami", headers=headers)
+        assert res.status_code == 200
+        assert res.json() == {"id": me["id"], "username": me["username"]}
+        assert selects.count == 0
+
+        assert client.get("/whoami").status_code == 401
+        assert client.get("/whoami", headers={"Authorization": "Bearer nope"}).status_code == 401
+
+        # Profile fields only; the payload is readable by anyone holding the token
+        strategy = get_jwt_strategy()
+        token = headers["Authorization"].removeprefix("Bearer ")
+        assert "email" not in decode_jwt(token, strategy.decode_key, strategy.token_audience)
+
+        # Deactivation revokes the token; reactivation lifts that again
+        manager = UserManager(None)
+        user = User(id=uuid.UUID(me["id"]), email="", hashed_password="", is_active=False)
+        asyncio.run(manager.on_after_update(user, {"is_active": False}))
+        assert client.get("/whoami", headers=headers).status_code == 401
+        user.is_active = True
+        asyncio.run(manager.on_after_update(user, {"is_active": True}))
+        assert client.get("/whoami", headers=headers).status_code == 200
+
+
+def test_reset_token_is_made_by_the_job(tmp_path, monkeypatch):
+    delivered = []
+    monkeypatch.setattr(src.auth, "deliver_notification", lambda user_id, notification, **data: delivered.append(data))
+
+    async def run():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/notify.db")
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+        session_maker = async_sessionmaker(engine, expire_on_commit=False)
+        queue = JobQueue(session_maker, workers=1, retry_base=0)
+        monkeypatch.setattr(src.jobs, "job_queue", queue)
+
+        async with session_maker() as session:
+            manager = UserManager(SQLAlchemyUserDatabase(session, User), password_helper)
+            user = await manager.create(UserCreate(email="reset@example.com", password="password123", username="reset"))
+            await manager.forgot_password(user)
+            payloads = (await session.execute(select(BackgroundJob.payload))).scalars().all()
+        await queue.drain()
+
+        async with session_maker() as session:
+            manager = UserManager(SQLAlchemyUserDatabase(session, User), password_helper)
+            await manager.reset_password(delivered[-1]["token"], "new-password")
+        await engine.dispose()
+        return payloads
+
+    payloads = asyncio.run(run())
+    # Only the notification and the user id are stored with the job
+    assert all("token" not in json.loads(payload) for payload in payloads)
+    assert "token" in delivered[-1]
+
+
+def test_notification_log_omits_token(caplog):
+    with caplog.at_level("INFO", logger="src.auth"):
+        src.auth.deliver_notification(uuid.uuid4(), "forgot_password", token="secret-token")
+        src.auth.deliver_notification(uuid.uuid4(), "request_verify", token="secret-token")
+    assert len(caplog.records) == 2
+    assert "secret-token" not in caplog.text
@@ -0,0 +1,78 @@
+import asyncio
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fastapi.testclient import TestClient
+from pwdlib import PasswordHash
+from pwdlib.hashers.argon2 import Argon2Hasher
+from sqlalchemy.future import select
+
+from main import app
+from src import auth
+from src.db import async_session_maker
+from src.models import User
+from src.rate_limit import RateLimiter
+
+
+def register(client, email, password="password123"):
+    res = client.post("/v1/auth/register", json={
+        "email": email,
+        "password": password,
+        "username": email.split("@")[0]
+    })
+    assert res.status_code in (201, 400), res.text
+
+
+def login(client, email, password="password123"):
+    return client.post("/v1/auth/jwt/login", data={"username": email, "password": password})
+
+
+def test_failed_logins_lock_the_account(monkeypatch):
+    monkeypatch.setattr(auth, "account_limiter", RateLimiter(limit=3, window=60))
+    with TestClient(app) as client:
+        register(client, "locked@example.com")
+        for _ in range(3):
+            assert login(client, "locked@example.com", "wrong-password").status_code == 400
+
+        res = login(client, "Locked@example.com")
+        assert res.status_code == 429
+        assert 1 <= int(res.headers["Retry-After"]) <= 60
+
+        # Other accounts are unaffected
+        register(client, "unlocked@example.com")
+        assert login(client, "unlocked@example.com").status_code == 200
+
+
+def test_requests_per_ip_are_limited(monkeypatch):
+    monkeypatch.setattr(auth, "ip_limiter", RateLimiter(limit=2, window=60))
+    with TestClient(app) as client:
+        register(client, "ip_limit@example.com")
+        assert login(client, "ip_limit@example.com").status_code == 200
+        res = login(client, "ip_limit@example.com")
+        assert res.status_code == 429
+        assert "Retry-After" in res.headers
+
+
+def test_login_rehashes_outdated_hashes():
+    with TestClient(app) as client:
+        register(client, "rehash@example.com")
+
+        async def downgrade():
+            weak = PasswordHash((Argon2Hasher(time_cost=1, memory_cost=8192, parallelism=1),))
+            async with async_session_maker() as session:
+                user = (await session.execute(select(User).where(User.email == "rehash@example.com"))).scalar_one()
+                user.hashed_password = weak.hash("password123")
+                await session.commit()
+                return user.hashed_password
+
+        async def stored():
+            async with async_session_maker() as session:
+                return await session.scalar(select(User.hashed_password).where(User.email == "rehash@example.com"))
+
+        weak_hash = asyncio.run(downgrade())
+        assert login(client, "rehash@example.com").status_code == 200
+        upgraded = asyncio.run(stored())
+        assert upgraded != weak_hash
+        assert "t=1," not in upgraded
+        # Still valid with the new hash
+        assert login(client, "rehash@example.com").status_code == 200
@@ -0,0 +1,144 @@
+from datetime import datetime
+from types import SimpleNamespace
+from fastapi.testclient import TestClient
+import sys
+import os
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import app
+from src.routers.events import _not_modified
+
+
+def get_auth_headers(client, email="test_events@example.com"):
+    password = "password123"
+    client.post("/v1/auth/register", json={
+        "email": email,
+        "password": password,
+        "username": "events_tester"
+    })
+    login_res = client.post("/v1/auth/jwt/login", data={
+        "username": email,
+        "password": password
+    })
+    assert login_res.status_code == 200, f"Login failed: {login_res.text}"
+    return {"Authorization": f"Bearer {login_res.json()['access_token']}"}
+
+
+def make_event(i, **overrides):
+    event = {
+        "title": f"Batch Event {i}",
+        "category": "Work",
+        "start_date": f"2025-03-{i % 28 + 1:02d}T10:00:00",
+        "end_date": f"2025-03-{i % 28 + 1:02d}T11:00:00",
+        "is_ai_generated": i % 10 == 0,
+    }
+    event.update(overrides)
+    return event
+
+
+def test_batch_create_events():
+    with TestClient(app) as client:
+        headers = get_auth_headers(client, "batch_create@example.com")
+        events = [make_event(i) for i in range(300)]
+
+        res = client.post("/v1/events/batch", json=events, headers=headers)
+        assert res.status_code == 201, res.text
+        results = res.json()
+        assert [r["index"] for r in results] == list(range(300))
+        assert all(r["status"] == "created" for r in results)
+
+        stored = client.get("/v1/events/", headers=headers).json()
+        assert {e["id"] for e in stored} >= {r["id"] for r in results}
+
+        feed = client.get("/v1/timeline/posts?limit=100", headers=headers).json()
+        auto_posts = [item for item in feed if item["post"]["event_id"] == results[0]["id"]]
+        assert len(auto_posts) == 1
+        assert auto_posts[0]["post"]["event_date"] == "2025/03/01"
+
+        res = client.post("/v1/events/batch", json=[make_event(0)] * 1001, headers=headers)
+        assert res.status_code == 413
+
+
+def test_upsert_by_ek_event_id():
+    with TestClient(app) as client:
+        headers = get_auth_headers(client, "upsert_events@example.com")
+        events = [make_event(i, ek_event_id=f"ek-{i}", is_ai_generated=True) for i in range(5)]
+
+        first = client.post("/v1/events/batch", json=events, headers=headers).json()
+        assert [r["status"] for r in first] == ["created"] * 5
+
+        # Re-sending the same calendar is a no-op
+        again = client.post("/v1/events/batch", json=events, headers=headers).json()
+        assert [r["status"] for r in again] == ["unchanged"] * 5
+        assert [r["id"] for r in again] == [r["id"] for r in first]
+
+        # A changed event is updated in place and its auto post follows
+        renamed = make_event(0, ek_event_id="ek-0", is_ai_generated=True, title="Renamed")
+        res = client.post("/v1/events/", json=renamed, headers=headers)
+        assert res.status_code == 201
+        assert res.json()["id"] == first[0]["id"]
+        assert res.json()["title"] == "Renamed"
+
+        stored = client.get("/v1/events/", headers=headers).json()
+        assert len([e for e in stored if e["ek_event_id"] == "ek-0"]) == 1
+
+        feed = client.get("/v1/timeline/posts?limit=100", headers=headers).json()
+        linked = [item["post"] for item in feed if item["post"]["event_id"] == first[0]["id"]]
+        assert [post["content"] for post in linked] == ["Renamed"]
+
+        res = client.post("/v1/events/?upsert=false", json=renamed, headers=headers)
+        assert res.status_code == 409
+
+
+def test_delta_sync_and_conditional_get():
+    with TestClient(app) as client:
+        headers = get_auth_headers(client, "delta_events@example.com")
+        events = [make_event(i, ek_event_id=f"delta-{i}") for i in range(3)]
+        created = client.post("/v1/events/batch", json=events, headers=headers).json()
+
+        res = client.get("/v1/events/", headers=headers)
+        assert res.status_code == 200
+        etag = res.headers["etag"]
+        synced_at = res.json()[0]["updated_at"]
+
+        # Unchanged calendar: 304 without a body
+        res = client.get("/v1/events/", headers={**headers, "If-None-Match": etag})
+        assert res.status_code == 304
+        # Last-Modified is only sent once the second it names is over
+        time.sleep(1)
+        res = client.get("/v1/events/", headers={**headers, "If-None-Match": etag})
+        res = client.get("/v1/events/", headers={**headers, "If-Modified-Since": res.headers["last-modified"]})
+        assert res.status_code == 304
+
+        # Unchanged re-sync does not move the ETag
+        client.post("/v1/events/batch", json=events, headers=headers)
+        assert client.get("/v1/events/", headers={**headers, "If-None-Match": etag}).status_code == 304
+
+        client.put(f"/v1/events/{created[1]['id']}", json={"title": "Moved"}, headers=headers)
+        assert client.delete(f"/v1/events/{created[2]['id']}", headers=headers).status_code == 204
+
+        res = client.get("/v1/events/", headers={**headers, "If-None-Match": etag})
+        assert res.status_code == 200
+        assert res.headers["etag"] != etag
+        assert {e["id"] for e in res.json()} == {created[0]["id"], created[1]["id"]}
+
+        delta = client.get("/v1/events/", params={"updated_since": synced_at}, headers=headers).json()
+        by_id = {e["id"]: e for e in delta}
+        assert set(by_id) == {created[1]["id"], created[2]["id"]}
+        assert by_id[created[1]["id"]]["title"] == "Moved"
+        assert by_id[created[2]["id"]]["deleted_at"] is not None
+
+        ranged = client.get("/v1/events/", params={
+            "start": "2025-03-02T00:00:00", "end": "2025-03-03T00:00:00"
+        }, headers=headers).json()
+        assert [e["id"] for e in ranged] == [created[1]["id"]]
+
+
+def test_if_modified_since_ignores_unsettled_second():
+    request = SimpleNamespace(headers={"if-modified-since": "Sat, 01 Mar 2025 10:00:00 GMT"})
+    # A second change within 10:00:00 has the same HTTP date as the first
+    changed = datetime(2025, 3, 1, 10, 0, 0, 700000)
+    assert not _not_modified(request, 'W/"events-2"', changed, now=datetime(2025, 3, 1, 10, 0, 0, 900000))
+    assert _not_modified(request, 'W/"events-2"', changed, now=datetime(2025, 3, 1, 10, 0, 1))
+    later = datetime(2025, 3, 1, 10, 0, 1, 100000)
+    assert not _not_modified(request, 'W/"events-3"', later, now=datetime(2025, 3, 1, 10, 0, 5))
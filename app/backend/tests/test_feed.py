@@ -0,0 +1,158 @@
+import asyncio
+import sys
+import os
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytest
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.future import select
+from sqlmodel import SQLModel
+
+from src.feed_cache import FeedCache, MemoryFeedBackend
+from src.feed import InvalidCursor, decode_cursor, encode_cursor, fetch_feed
+from src.models import ScheduleEvent, TimelinePost, TimelineReaction, User
+from src.reactions import rebuild_reaction_counters, set_reaction
+
+
+async def seed(session, post_count: int):
+    author = User(email="author@example.com", hashed_password="x", username="author")
+    viewer = User(email="viewer@example.com", hashed_password="x", username="viewer")
+    session.add_all([author, viewer])
+    base = datetime(2025, 1, 1)
+    for i in range(post_count):
+        event_row = ScheduleEvent(
+            user_id=author.id,
+            title=f"event {i}",
+            category="Work",
+            start_date=base,
+            end_date=base,
+        )
+        post = TimelinePost(
+            user_id=author.id,
+            event_id=event_row.id,
+            content=f"post {i}",
+            created_at=base + timedelta(minutes=i),
+        )
+        session.add_all([event_row, post])
+        session.add(TimelineReaction(user_id=author.id, post_id=post.id, reaction_type="point"))
+        if i % 2 == 0:
+            session.add(TimelineReaction(user_id=viewer.id, post_id=post.id, reaction_type="hand"))
+    await session.commit()
+    # Counters are derived from the reaction rows seeded above
+    await rebuild_reaction_counters(session)
+    return viewer
+
+
+async def count_feed_queries(tmp_path, limits):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/feed.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    async with session_maker() as session:
+        viewer = await seed(session, post_count=max(limits))
+
+    counts = {}
+    pages = {}
+    for limit in limits:
+        statements.clear()
+        async with session_maker() as session:
+            pages[limit] = await fetch_feed(session, viewer.id, limit=limit)
+        counts[limit] = len(statements)
+
+    await engine.dispose()
+    return counts, pages
+
+
+def test_feed_query_count_is_flat(tmp_path):
+    counts, pages = asyncio.run(count_feed_queries(tmp_path, [5, 50, 100]))
+
+    assert counts[5] == counts[50] == counts[100] == 1, counts
+    assert len(pages[100]) == 100
+
+    newest = pages[5][0]
+    assert newest.post.content == "post 99"
+    assert newest.user.username == "author"
+    assert newest.likes == 1
+    assert newest.my_reaction is None
+    assert pages[5][1].likes == 2
+    assert pages[5][1].reactions.point == 1
+    assert pages[5][1].reactions.hand == 1
+    assert pages[5][1].my_reaction == "hand"
+
+
+async def walk_with_cursor(tmp_path, page_size):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/cursor.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    async with session_maker() as session:
+        viewer = await seed(session, post_count=25)
+
+    seen = []
+    cursor = None
+    while True:
+        async with session_maker() as session:
+            page = await fetch_feed(session, viewer.id, limit=page_size, cursor=cursor)
+        seen.extend(item.post.content for item in page)
+        if len(page) < page_size:
+            break
+        cursor = decode_cursor(encode_cursor(page[-1].post))
+
+    async with session_maker() as session:
+        by_offset = await fetch_feed(session, viewer.id, limit=10, offset=10)
+
+    await engine.dispose()
+    return seen, [item.post.content for item in by_offset]
+
+
+def test_feed_cursor_pagination(tmp_path):
+    seen, by_offset = asyncio.run(walk_with_cursor(tmp_path, page_size=10))
+
+    assert seen == [f"post {i}" for i in range(24, -1, -1)]
+    assert by_offset == seen[10:20]
+
+
+def test_invalid_cursor_is_rejected():
+    with pytest.raises(InvalidCursor):
+        decode_cursor("not-a-cursor")
+
+
+async def read_through_cache(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/feed.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    async with session_maker() as session:
+        viewer = await seed(session, post_count=4)
+
+    cache = FeedCache(MemoryFeedBackend(maxsize=8, ttl=60))
+    async with session_maker() as session:
+        author = (await session.execute(select(User).where(User.username == "author"))).scalars().one()
+        as_author = await cache.fetch(session, author.id, limit=2)
+        as_viewer = await cache.fetch(session, viewer.id, limit=2)
+        await set_reaction(session, viewer.id, as_viewer[0].post.id, "pinch")
+        await session.commit()
+        await cache.invalidate()
+        after_write = await cache.fetch(session, viewer.id, limit=2)
+
+    await engine.dispose()
+    return cache, as_author, as_viewer, after_write
+
+
+def test_feed_cache_shares_pages_but_not_my_reaction(tmp_path):
+    cache, as_author, as_viewer, after_write = asyncio.run(read_through_cache(tmp_path))
+
+    assert [item.my_reaction for item in as_author] == ["point", "point"]
+    # Served from the author's cached page, with the viewer's own reactions merged in
+    assert [item.my_reaction for item in as_viewer] == [None, "hand"]
+    assert [item.likes for item in as_viewer] == [1, 2]
+    # The write invalidated the page
+    assert after_write[0].my_reaction == "pinch"
+    assert after_write[0].likes == 2
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
@@ -0,0 +1,186 @@
+import asyncio
+import sys
+import os
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlalchemy import func
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.future import select
+from sqlmodel import SQLModel
+
+import src.home_timeline
+from src.feed import fetch_feed
+from src.home_timeline import (
+    _fan_out_job, fan_out_posts, write_to_home_timelines, fetch_home_feed, trim_home_timelines,
+)
+from src.models import HomeTimelineEntry, ScheduleEvent, TimelinePost, User
+
+
+def make_post(author: User, minute: int):
+    base = datetime(2025, 1, 1)
+    event_row = ScheduleEvent(user_id=author.id, title="e", category="Work", start_date=base, end_date=base)
+    post = TimelinePost(
+        user_id=author.id,
+        event_id=event_row.id,
+        content=f"post {minute}",
+        created_at=base + timedelta(minutes=minute),
+    )
+    return event_row, post
+
+
+async def page_ids(read, session, viewer, limit):
+    ids, cursor = [], None
+    while True:
+        page = await read(session, viewer.id, limit=limit, cursor=cursor)
+        ids += [item.post.id for item in page]
+        if len(page) < limit:
+            return ids
+        cursor = (page[-1].post.created_at, page[-1].post.id)
+
+
+async def materialize(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/home.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+    async with session_maker() as session:
+        # Posts from before the switch to fan-out have no home rows
+        author = User(email="author@example.com", hashed_password="x", username="author")
+        readers = [User(email=f"r{i}@example.com", hashed_password="x", username=f"r{i}") for i in range(3)]
+        session.add_all([author, *readers])
+        for minute in range(5):
+            session.add_all(make_post(author, minute))
+        await session.commit()
+
+        src.home_timeline.HOME_TIMELINE_MODE = "fanout"
+        for minute in range(5, 12):
+            event_row, post = make_post(author, minute)
+            session.add_all([event_row, post])
+            await write_to_home_timelines(session, [post])
+        await session.commit()
+        rows_per_reader = await session.scalar(
+            select(func.count()).where(HomeTimelineEntry.user_id == readers[0].id)
+        )
+
+        viewer = readers[0]
+        shared = await page_ids(fetch_feed, session, viewer, limit=3)
+        home = await page_ids(fetch_home_feed, session, viewer, limit=3)
+        offset_page = await fetch_home_feed(session, viewer.id, limit=4, offset=6)
+
+        await trim_home_timelines(session, depth=4)
+        await session.commit()
+        trimmed = await page_ids(fetch_home_feed, session, viewer, limit=3)
+
+        # Too many readers: flagged and merged in at read time
+        src.home_timeline.HOME_TIMELINE_FANOUT_LIMIT = 2
+        event_row, loud = make_post(author, 60)
+        session.add_all([event_row, loud])
+        await write_to_home_timelines(session, [loud])
+        await session.commit()
+        loud_rows = await session.scalar(select(func.count()).where(HomeTimelineEntry.post_id == loud.id))
+        first = await fetch_home_feed(session, viewer.id, limit=2)
+
+    await engine.dispose()
+    return rows_per_reader, shared, home, offset_page, trimmed, loud, loud_rows, first
+
+
+def test_fan_out_on_write_matches_shared_feed(tmp_path, monkeypatch):
+    monkeypatch.setattr(src.home_timeline, "HOME_TIMELINE_MODE", "global")
+    monkeypatch.setattr(src.home_timeline, "HOME_TIMELINE_FANOUT_LIMIT", 10000)
+    rows_per_reader, shared, home, offset_page, trimmed, loud, loud_rows, first = asyncio.run(materialize(tmp_path))
+
+    assert rows_per_reader == 7
+    assert len(shared) == 12
+    # Older posts continue from the shared feed, with no gaps or repeats
+    assert home == shared
+    assert [item.post.id for item in offset_page] == shared[6:10]
+    assert trimmed == shared
+
+    assert loud_rows == 0
+    assert [item.post.id for item in first] == [loud.id, shared[0]]
+
+
+async def interleave(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/interleaved.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+    async with session_maker() as session:
+        author = User(email="author@example.com", hashed_password="x", username="author")
+        viewer = User(email="viewer@example.com", hashed_password="x", username="viewer")
+        session.add_all([author, viewer])
+        await session.commit()
+
+        # Odd posts come from an author over the fan-out limit, even ones are fanned out
+        for minute in range(20):
+            src.home_timeline.HOME_TIMELINE_FANOUT_LIMIT = 0 if minute % 2 else 10000
+            event_row, post = make_post(author, minute)
+            session.add_all([event_row, post])
+            await write_to_home_timelines(session, [post])
+        await trim_home_timelines(session, depth=4)
+        await session.commit()
+
+        shared = await page_ids(fetch_feed, session, viewer, limit=3)
+        home = await page_ids(fetch_home_feed, session, viewer, limit=3)
+        offset_pages = [
+            [item.post.id for item in await fetch_home_feed(session, viewer.id, limit=3, offset=offset)]
+            for offset in range(0, 21, 3)
+        ]
+    await engine.dispose()
+    return shared, home, offset_pages
+
+
+def test_pulled_posts_stop_at_oldest_kept_row(tmp_path, monkeypatch):
+    monkeypatch.setattr(src.home_timeline, "HOME_TIMELINE_MODE", "fanout")
+    monkeypatch.setattr(src.home_timeline, "HOME_TIMELINE_FANOUT_LIMIT", 10000)
+    shared, home, offset_pages = asyncio.run(interleave(tmp_path))
+
+    assert len(shared) == 20
+    # Below the reader's 4 kept rows, pulled and ordinary posts both come from the shared feed
+    assert home == shared
+    assert [post_id for page in offset_pages for post_id in page] == shared
+
+
+async def deliver_twice(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/redelivered.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+    async with session_maker() as session:
+        author = User(email="author@example.com", hashed_password="x", username="author")
+        reader = User(email="reader@example.com", hashed_password="x", username="reader")
+        session.add_all([author, reader])
+        posts = []
+        for minute, limit in ((0, 10000), (1, 1)):
+            src.home_timeline.HOME_TIMELINE_FANOUT_LIMIT = limit
+            event_row, post = make_post(author, minute)
+            session.add_all([event_row, post])
+            await fan_out_posts(session, [post])
+            await session.commit()
+            posts.append(post)
+            before_job = [item.post.id for item in await fetch_home_feed(session, author.id, limit=10)]
+
+            # At-least-once delivery: the same job may run again
+            for _ in range(2):
+                await _fan_out_job(session, {"post_ids": [str(post.id)]})
+                await session.commit()
+        rows = dict((await session.execute(
+            select(HomeTimelineEntry.post_id, func.count()).group_by(HomeTimelineEntry.post_id)
+        )).all())
+        author_feed = [item.post.id for item in await fetch_home_feed(session, author.id, limit=10)]
+    await engine.dispose()
+    return posts, before_job, rows, author_feed
+
+
+def test_fan_out_job_can_run_twice(tmp_path, monkeypatch):
+    monkeypatch.setattr(src.home_timeline, "HOME_TIMELINE_MODE", "fanout")
+    monkeypatch.setattr(src.home_timeline, "HOME_TIMELINE_FANOUT_LIMIT", 10000)
+    (fanned, pulled), before_job, rows, author_feed = asyncio.run(deliver_twice(tmp_path))
+
+    # The author sees their post before the job has run
+    assert before_job[0] == pulled.id
+    assert rows == {fanned.id: 2}
+    assert author_feed == [pulled.id, fanned.id]
@@ -0,0 +1,156 @@
+from fastapi.testclient import TestClient
+import asyncio
+import base64
+import hashlib
+import io
+import time
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from main import app
+import pytest
+import src.icons
+import src.storage
+import src.jobs
+
+# 1x1 transparent PNG
+PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+)
+
+
+def get_auth_headers(client):
+    email = "test_icons@example.com"
+    password = "password123"
+    client.post("/v1/auth/register", json={
+        "email": email,
+        "password": password,
+        "username": "icon_tester"
+    })
+    login_res = client.post("/v1/auth/jwt/login", data={
+        "username": email,
+        "password": password
+    })
+    assert login_res.status_code == 200, f"Login failed: {login_res.text}"
+    return {"Authorization": f"Bearer {login_res.json()['access_token']}"}
+
+
+def create_post(client, headers):
+    event_res = client.post("/v1/events/", json={
+        "title": "Icon Test Event",
+        "category": "Test",
+        "start_date": "2025-12-25T10:00:00",
+        "end_date": "2025-12-25T12:00:00"
+    }, headers=headers)
+    assert event_res.status_code == 201, event_res.text
+    post_res = client.post("/v1/timeline/posts", json={
+        "event_id": event_res.json()["id"],
+        "content": "icon post"
+    }, headers=headers)
+    assert post_res.status_code == 200, post_res.text
+    return post_res.json()["id"]
+
+
+def test_icon_upload(monkeypatch):
+    with TestClient(app) as client:
+        headers = get_auth_headers(client)
+        post_id = create_post(client, headers)
+        url = f"/v1/timeline/posts/{post_id}/icon"
+
+        res = client.post(url, files={"file": ("icon.png", PNG, "image/png")}, headers=headers)
+        assert res.status_code == 200, res.text
+        icon_url = res.json()["icon_url"]
+        assert icon_url == f"/storage/icons/{hashlib.sha256(PNG).hexdigest()}.png"
+
+        icon = client.get(icon_url)
+        assert icon.content == PNG
+        assert "immutable" in icon.headers["cache-control"]
+        res = client.get(icon_url, headers={"If-None-Match": icon.headers["etag"]})
+        assert res.status_code == 304
+
+        # Identical bytes on another post share the stored object
+        other_id = create_post(client, headers)
+        res = client.post(f"/v1/timeline/posts/{other_id}/icon", files={"file": ("same.png", PNG, "image/png")}, headers=headers)
+        assert res.status_code == 200, res.text
+        assert res.json()["icon_url"] == icon_url
+
+        # Declared type must match the bytes
+        res = client.post(url, files={"file": ("icon.png", b"not an image", "image/png")}, headers=headers)
+        assert res.status_code == 415
+        res = client.post(url, files={"file": ("icon.txt", PNG, "text/plain")}, headers=headers)
+        assert res.status_code == 415
+
+        monkeypatch.setattr(src.icons, "ICON_MAX_BYTES", 16)
+        res = client.post(url, files={"file": ("icon.png", PNG, "image/png")}, headers=headers)
+        assert res.status_code == 413
+
+        # Nothing is left behind in the staging dir once the thumbnail jobs,
+        # which stage their copies there too, have finished
+        for _ in range(100):
+            client.portal.call(src.jobs.job_queue.drain)
+            if not os.listdir(src.icons.ICON_STAGING_DIR):
+                break
+            time.sleep(0.02)
+        assert os.listdir(src.icons.ICON_STAGING_DIR) == []
+
+
+def test_icon_thumbnail_job():
+    Image = pytest.importorskip("PIL.Image")
+    source = io.BytesIO()
+    Image.new("RGB", (400, 300), (200, 40, 40)).save(source, format="PNG")
+    png = source.getvalue()
+
+    with TestClient(app) as client:
+        headers = get_auth_headers(client)
+        post_id = create_post(client, headers)
+        res = client.post(f"/v1/timeline/posts/{post_id}/icon", files={"file": ("big.png", png, "image/png")}, headers=headers)
+        assert res.status_code == 200, res.text
+        # Made after the response, by the job queue
+        assert res.json()["icon_thumbnail_url"] is None
+
+        digest = hashlib.sha256(png).hexdigest()
+        expected = f"/storage/icons/{digest}_{src.icons.ICON_THUMBNAIL_SIZE}.webp"
+        for _ in range(100):
+            client.portal.call(src.jobs.job_queue.drain)
+            feed = client.get("/v1/timeline/posts?limit=100", headers=headers).json()
+            post = next(item["post"] for item in feed if item["post"]["id"] == post_id)
+            if post["icon_thumbnail_url"] is not None:
+                break
+            time.sleep(0.02)
+        assert post["icon_thumbnail_url"] == expected
+
+        thumbnail = client.get(expected)
+        assert thumbnail.status_code == 200
+        with Image.open(io.BytesIO(thumbnail.content)) as image:
+            assert image.format == "WEBP"
+            assert max(image.size) == src.icons.ICON_THUMBNAIL_SIZE
+
+
+# Over ICON_MAX_PIXELS (warned about by Pillow) and over twice it (refused by Pillow)
+@pytest.mark.parametrize("max_pixels", [6000, 2500])
+def test_oversized_icon_gets_no_thumbnail(tmp_path, monkeypatch, max_pixels):
+    Image = pytest.importorskip("PIL.Image")
+    monkeypatch.setattr(src.icons, "ICON_MAX_PIXELS", max_pixels)
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", max_pixels)
+    source = tmp_path / "bomb.png"
+    Image.new("RGB", (100, 100)).save(source, format="PNG")
+
+    digest = f"bomb{max_pixels}"
+    assert asyncio.run(src.icons._store_thumbnail(str(source), digest)) is None
+    assert not asyncio.run(src.icons.storage.exists(src.icons._thumbnail_key(digest)))
+
+
+def test_storage_backend_must_implement_fetch():
+    class NoFetch(src.storage.Storage):
+        async def exists(self, key):
+            return False
+
+        async def put(self, key, source_path, content_type):
+            pass
+
+        async def delete(self, key):
+            pass
+
+    # The thumbnail job needs fetch(); a backend without it fails when built, not mid-job
+    with pytest.raises(TypeError, match="fetch"):
+        NoFetch()
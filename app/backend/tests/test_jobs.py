@@ -0,0 +1,76 @@
+import asyncio
+import sys
+import os
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.future import select
+from sqlmodel import SQLModel
+
+import src.jobs
+from src.jobs import JobQueue, enqueue, job
+from src.models import BackgroundJob
+
+calls = []
+
+
+@job("test.flaky")
+async def flaky(db, payload):
+    calls.append(payload["n"])
+    if calls.count(payload["n"]) < 2:
+        raise RuntimeError("first attempt fails")
+
+
+@job("test.broken")
+async def broken(db, payload):
+    raise RuntimeError("always fails")
+
+
+async def run_queue(tmp_path, monkeypatch):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/jobs.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+    queue = JobQueue(session_maker, workers=2, retry_base=0, poll=0.05)
+    # Commits wake this queue's workers
+    monkeypatch.setattr(src.jobs, "job_queue", queue)
+
+    async with session_maker() as session:
+        await enqueue(session, "test.flaky", n=1)
+        broken_job = await enqueue(session, "test.broken")
+        broken_job.max_attempts = 2
+        # Claimed by a worker that died: picked up again once the lease is over
+        session.add(BackgroundJob(
+            kind="test.flaky", payload='{"n": 2}', status="running", attempts=1,
+            locked_until=datetime.utcnow() - timedelta(seconds=1),
+        ))
+        await session.commit()
+
+    ran = await queue.drain()
+
+    # Workers pick up jobs committed while they run
+    await queue.start()
+    async with session_maker() as session:
+        await enqueue(session, "test.flaky", n=3)
+        await session.commit()
+    for _ in range(100):
+        if queue.processed == 3:
+            break
+        await asyncio.sleep(0.02)
+    await queue.stop()
+
+    async with session_maker() as session:
+        left = (await session.execute(select(BackgroundJob))).scalars().all()
+    await engine.dispose()
+    return queue, ran, left
+
+
+def test_job_queue_retries_and_persists_failures(tmp_path, monkeypatch):
+    queue, ran, left = asyncio.run(run_queue(tmp_path, monkeypatch))
+
+    assert ran == 6
+    assert sorted(calls) == [1, 1, 2, 2, 3, 3]
+    assert queue.stats() == {"processed": 3, "retried": 4, "failed": 1}
+    # Only the job that ran out of attempts is kept, with its error
+    assert [(j.kind, j.status, j.attempts) for j in left] == [("test.broken", "failed", 2)]
+    assert "always fails" in left[0].last_error
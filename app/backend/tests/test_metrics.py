@@ -0,0 +1,56 @@
+import json
+import logging
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fastapi.testclient import TestClient
+
+from main import app
+from src.observability import JsonFormatter, db_statements
+
+
+def get_auth_headers(client):
+    email = "test_metrics@example.com"
+    password = "password123"
+    client.post("/v1/auth/register", json={
+        "email": email,
+        "password": password,
+        "username": "metrics_tester"
+    })
+    login_res = client.post("/v1/auth/jwt/login", data={
+        "username": email,
+        "password": password
+    })
+    assert login_res.status_code == 200, f"Login failed: {login_res.text}"
+    return {"Authorization": f"Bearer {login_res.json()['access_token']}"}
+
+
+def test_metrics_count_statements_per_route():
+    with TestClient(app) as client:
+        headers = get_auth_headers(client)
+        for _ in range(3):
+            assert client.get("/v1/timeline/posts", headers=headers).status_code == 200
+        client.get("/no/such/path")
+
+        res = client.get("/metrics")
+        assert res.status_code == 200
+        text = res.text
+
+    labels = ("GET", "/v1/timeline/posts")
+    # Every feed read issued some SQL, and it was attributed to the route template
+    assert db_statements.sums[labels] > 0
+    assert 'http_request_db_statements_count{method="GET",route="/v1/timeline/posts"} ' in text
+    assert 'http_requests_total{method="GET",route="/v1/timeline/posts",status="200"}' in text
+    assert 'route="unmatched",status="404"' in text
+    assert "feed_cache_hits_total" in text
+    assert "background_jobs_processed_total" in text
+
+
+def test_json_log_lines_carry_extra_fields():
+    record = logging.LogRecord("src.test", logging.INFO, __file__, 1, "Receiving event sync", None, None)
+    record.title = "Dentist"
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert entry["level"] == "INFO"
+    assert entry["message"] == "Receiving event sync"
+    assert entry["title"] == "Dentist"
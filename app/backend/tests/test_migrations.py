@@ -0,0 +1,87 @@
+import asyncio
+import sqlite3
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.migrations import MIGRATIONS, run_migrations
+
+# Schema as created by the first release, before counters and indexes existed
+LEGACY_SCHEMA = """
+CREATE TABLE user (
+    id CHAR(32) NOT NULL, email VARCHAR(320) NOT NULL, hashed_password VARCHAR NOT NULL,
+    is_active BOOLEAN NOT NULL, is_superuser BOOLEAN NOT NULL, is_verified BOOLEAN NOT NULL,
+    username VARCHAR NOT NULL, created_at DATETIME NOT NULL, PRIMARY KEY (id)
+);
+CREATE UNIQUE INDEX ix_user_email ON user (email);
+CREATE TABLE scheduleevent (
+    title VARCHAR NOT NULL, category VARCHAR NOT NULL, start_date DATETIME NOT NULL,
+    end_date DATETIME NOT NULL, is_ai_generated BOOLEAN NOT NULL, ek_event_id VARCHAR,
+    color_hex VARCHAR, id CHAR(32) NOT NULL, user_id CHAR(32) NOT NULL,
+    created_at DATETIME NOT NULL, PRIMARY KEY (id)
+);
+CREATE TABLE userprofile (
+    encoded_preferences VARCHAR NOT NULL, user_id CHAR(32) NOT NULL,
+    last_updated DATETIME NOT NULL, PRIMARY KEY (user_id)
+);
+CREATE TABLE timelinepost (
+    content VARCHAR NOT NULL, category VARCHAR, icon_url VARCHAR, event_date VARCHAR,
+    color_hex VARCHAR, id CHAR(32) NOT NULL, user_id CHAR(32) NOT NULL,
+    event_id CHAR(32) NOT NULL, created_at DATETIME NOT NULL, PRIMARY KEY (id)
+);
+CREATE TABLE timelinereaction (
+    id CHAR(32) NOT NULL, user_id CHAR(32) NOT NULL, post_id CHAR(32) NOT NULL,
+    reaction_type VARCHAR NOT NULL, created_at DATETIME NOT NULL, PRIMARY KEY (id)
+);
+INSERT INTO scheduleevent VALUES ('old', 'Work', '2025-01-01 00:00:00', '2025-01-01 00:00:00', 0, 'ek-1', NULL, 'e0', 'u1', '2025-01-01 00:00:00');
+INSERT INTO scheduleevent VALUES ('new', 'Work', '2025-01-01 00:00:00', '2025-01-01 00:00:00', 0, 'ek-1', NULL, 'e1', 'u1', '2025-01-02 00:00:00');
+INSERT INTO timelinepost VALUES ('hi', NULL, NULL, NULL, NULL, 'p1', 'u1', 'e1', '2025-01-01 00:00:00');
+INSERT INTO timelinereaction VALUES ('r1', 'u1', 'p1', 'point', '2025-01-01 00:00:00');
+INSERT INTO timelinereaction VALUES ('r2', 'u1', 'p1', 'hand', '2025-01-02 00:00:00');
+INSERT INTO timelinereaction VALUES ('r3', 'u2', 'p1', 'hand', '2025-01-01 00:00:00');
+"""
+
+
+async def migrate_twice(path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    first = await run_migrations(engine)
+    second = await run_migrations(engine)
+    await engine.dispose()
+    return first, second
+
+
+def test_migrations_upgrade_legacy_database(tmp_path):
+    path = tmp_path / "legacy.db"
+    with sqlite3.connect(path) as conn:
+        conn.executescript(LEGACY_SCHEMA)
+
+    first, second = asyncio.run(migrate_twice(path))
+    assert [m.version for m in first] == [m.version for m in MIGRATIONS]
+    assert second == []
+
+    with sqlite3.connect(path) as conn:
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        reactions = conn.execute("SELECT id FROM timelinereaction ORDER BY id").fetchall()
+        ek_ids = conn.execute("SELECT id, ek_event_id FROM scheduleevent ORDER BY id").fetchall()
+        sync_state = conn.execute("SELECT user_id, version, modified_at FROM eventsyncstate").fetchall()
+        counters = conn.execute(
+            "SELECT like_count, point_count, hand_count FROM timelinepost WHERE id = 'p1'"
+        ).fetchone()
+
+    assert {
+        "ix_scheduleevent_user_id",
+        "ix_timelinepost_user_id",
+        "ix_timelinepost_event_id",
+        "ix_timelinepost_created_at_id",
+        "ix_timelinereaction_user_id",
+        "ux_timelinereaction_post_id_user_id",
+        "ux_scheduleevent_user_id_ek_event_id",
+        "ix_scheduleevent_user_id_updated_at",
+    } <= indexes
+    # Duplicate EventKit ids stay on the newest copy only
+    assert ek_ids == [("e0", None), ("e1", "ek-1")]
+    assert sync_state == [("u1", 1, "2025-01-02 00:00:00")]
+    # The older duplicate from u1 is dropped, its newer reaction kept
+    assert reactions == [("r2",), ("r3",)]
+    assert counters == (2, 0, 2)
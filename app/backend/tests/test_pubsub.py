@@ -0,0 +1,146 @@
+import asyncio
+import json
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fastapi.testclient import TestClient
+
+from main import app
+import src.pubsub
+from src.pubsub import LocalBroker, sse_events
+
+
+def get_auth_headers(client):
+    email = "test_pubsub@example.com"
+    password = "password123"
+    client.post("/v1/auth/register", json={
+        "email": email,
+        "password": password,
+        "username": "pubsub_tester"
+    })
+    login_res = client.post("/v1/auth/jwt/login", data={
+        "username": email,
+        "password": password
+    })
+    assert login_res.status_code == 200, f"Login failed: {login_res.text}"
+    return {"Authorization": f"Bearer {login_res.json()['access_token']}"}
+
+
+def parse(chunk: str):
+    data = [line[len("data: "):] for line in chunk.splitlines() if line.startswith("data: ")]
+    return json.loads(data[0]) if data else None
+
+
+async def stream_with_slow_client(monkeypatch):
+    broker = LocalBroker(queue_size=2)
+    monkeypatch.setattr(src.pubsub, "broker", broker)
+
+    stream = sse_events("timeline", heartbeat=0.01)
+    assert (await stream.__anext__()).startswith("retry:")
+    assert len(broker.subscriptions["timeline"]) == 1
+
+    # Idle streams send a heartbeat comment
+    assert (await stream.__anext__()).startswith(":")
+
+    for i in range(3):
+        await broker.publish("timeline", {"type": "post.deleted", "post_id": str(i)})
+    received = [parse(await stream.__anext__()) for _ in range(3)]
+
+    await stream.aclose()
+    return broker, received
+
+
+def test_sse_stream_fans_out_and_signals_resync(monkeypatch):
+    broker, received = asyncio.run(stream_with_slow_client(monkeypatch))
+
+    # The third delta did not fit the client's buffer
+    assert [m["type"] for m in received] == ["resync", "post.deleted", "post.deleted"]
+    assert [m.get("post_id") for m in received] == [None, "0", "1"]
+    assert not broker.subscriptions["timeline"]
+
+
+def test_timeline_writes_publish_deltas(monkeypatch):
+    published = []
+
+    async def record(channel, message):
+        published.append(message)
+
+    monkeypatch.setattr(src.pubsub.broker, "publish", record)
+
+    with TestClient(app) as client:
+        headers = get_auth_headers(client)
+        event_res = client.post("/v1/events/", json={
+            "title": "Stream Test Event",
+            "category": "Test",
+            "start_date": "2025-12-25T10:00:00",
+            "end_date": "2025-12-25T12:00:00",
+            "is_ai_generated": True
+        }, headers=headers)
+        assert event_res.status_code == 201, event_res.text
+        post_res = client.post("/v1/timeline/posts", json={
+            "event_id": event_res.json()["id"],
+            "content": "streamed"
+        }, headers=headers)
+        post_id = post_res.json()["id"]
+        client.post(f"/v1/timeline/posts/{post_id}/reactions?reaction_type=hand", headers=headers)
+        client.delete(f"/v1/timeline/posts/{post_id}", headers=headers)
+
+    assert [m["type"] for m in published] == ["timeline.changed", "post.created", "post.reactions", "post.deleted"]
+    created = published[1]["item"]
+    assert created["post"]["id"] == post_id
+    assert created["user"]["username"] == "pubsub_tester"
+    assert published[2]["reactions"]["hand"] == 1
+    assert published[2]["likes"] == 1
+    assert published[3] == {"type": "post.deleted", "post_id": post_id}
+
+
+class FakePubSub:
+    def __init__(self, messages):
+        self.messages = messages
+
+    async def psubscribe(self, pattern):
+        pass
+
+    async def listen(self):
+        for message in self.messages:
+            if isinstance(message, Exception):
+                raise message
+            yield message
+
+    async def aclose(self):
+        pass
+
+
+class FakeRedis:
+    def __init__(self, connections):
+        self.connections = connections
+
+    def pubsub(self):
+        return FakePubSub(self.connections.pop(0))
+
+    async def aclose(self):
+        pass
+
+
+async def relay_across_reconnect(monkeypatch):
+    redis = FakeRedis([
+        [{"type": "pmessage", "channel": b"pubsub:timeline", "data": b'{"type": "post.deleted", "post_id": "1"}'},
+         ConnectionError("connection lost")],
+        [{"type": "pmessage", "channel": b"pubsub:timeline", "data": b'{"type": "post.deleted", "post_id": "2"}'}],
+    ])
+    monkeypatch.setattr(src.pubsub, "aioredis", type("FakeModule", (), {"from_url": staticmethod(lambda url: redis)}))
+    broker = src.pubsub.RedisBroker(reconnect_delay=0.01)
+
+    async with broker.subscribe("timeline") as subscription:
+        await broker.start()
+        received = [await subscription.get(timeout=1) for _ in range(3)]
+        await broker.close()
+    return received
+
+
+def test_redis_relay_reconnects_and_resyncs(monkeypatch):
+    received = asyncio.run(relay_across_reconnect(monkeypatch))
+
+    # Messages published while disconnected are lost, so streams are told to refetch
+    assert [m["type"] for m in received] == ["post.deleted", "resync", "post.deleted"]
+    assert [m.get("post_id") for m in received] == ["1", None, "2"]
@@ -0,0 +1,56 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from src import server
+
+
+def test_serve_prepares_once_before_starting_workers(monkeypatch):
+    calls = []
+
+    async def fake_prepare():
+        calls.append("prepare")
+
+    def fake_run(app, **options):
+        calls.append(("run", app, options["workers"], os.environ.get(server.PREPARED_ENV)))
+
+    monkeypatch.setattr(server, "prepare", fake_prepare)
+    monkeypatch.setattr(server.uvicorn, "run", fake_run)
+    monkeypatch.setattr(server, "PUBSUB_BACKEND", "redis")
+    monkeypatch.delenv(server.PREPARED_ENV, raising=False)
+    server.serve(workers=2)
+    monkeypatch.delenv(server.PREPARED_ENV)
+
+    # Workers are started with the flag set, after the one-time work
+    assert calls == ["prepare", ("run", "main:app", 2, "1")]
+
+
+def test_serve_refuses_workers_with_local_pubsub(monkeypatch):
+    async def fake_prepare():
+        raise AssertionError("should fail before startup work")
+
+    monkeypatch.setattr(server, "prepare", fake_prepare)
+    monkeypatch.setattr(server, "PUBSUB_BACKEND", "local")
+    with pytest.raises(RuntimeError):
+        server.serve(workers=2)
+
+
+def test_workers_skip_startup_work(monkeypatch):
+    calls = []
+
+    async def fake_prepare():
+        calls.append("prepare")
+
+    monkeypatch.setattr(main, "prepare", fake_prepare)
+    monkeypatch.setenv(server.PREPARED_ENV, "1")
+    with TestClient(main.app) as client:
+        assert client.get("/").status_code == 200
+    assert calls == []
+
+    monkeypatch.delenv(server.PREPARED_ENV)
+    with TestClient(main.app) as client:
+        assert client.get("/").status_code == 200
+    assert calls == ["prepare"]
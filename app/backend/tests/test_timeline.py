@@ -65,9 +65,9 @@ def test_timeline_lifecycle():
         assert len(posts) > 0
         # Check if our created post is in the list
         found = False
-        for post in posts:
-            if post["id"] == post_id:
-                assert post["content"] == post_data["content"]
+        for item in posts:
+            if item["post"]["id"] == post_id:
+                assert item["post"]["content"] == post_data["content"]
                 found = True
                 break
         assert found, f"Post with ID {post_id} not found in timeline"
@@ -81,9 +81,57 @@ def test_timeline_lifecycle():
         assert response.status_code == 200
         posts = response.json()
         found = False
-        for post in posts:
-            if post["id"] == post_id:
+        for item in posts:
+            if item["post"]["id"] == post_id:
                 found = True
                 break
         assert not found, f"Post with ID {post_id} should have been deleted"
         print("Test passed successfully!")
+
+def test_reaction_counters():
+    with TestClient(app) as client:
+        headers = get_auth_headers(client)
+        event_res = client.post("/v1/events/", json={
+            "title": "Reaction Test Event",
+            "category": "Test",
+            "start_date": "2025-12-25T10:00:00",
+            "end_date": "2025-12-25T12:00:00"
+        }, headers=headers)
+        post_res = client.post("/v1/timeline/posts", json={
+            "event_id": event_res.json()["id"],
+            "content": "React to me"
+        }, headers=headers)
+        post_id = post_res.json()["id"]
+
+        def feed_item():
+            posts = client.get("/v1/timeline/posts", headers=headers).json()
+            return next(item for item in posts if item["post"]["id"] == post_id)
+
+        res = client.post(f"/v1/timeline/posts/{post_id}/reactions?reaction_type=point", headers=headers)
+        assert res.status_code == 200
+        item = feed_item()
+        assert item["likes"] == 1
+        assert item["reactions"]["point"] == 1
+        assert item["my_reaction"] == "point"
+
+        # Changing the type moves the breakdown but not the total
+        client.post(f"/v1/timeline/posts/{post_id}/reactions?reaction_type=thumbsUp", headers=headers)
+        item = feed_item()
+        assert item["likes"] == 1
+        assert item["reactions"]["point"] == 0
+        assert item["reactions"]["thumbsUp"] == 1
+
+        res = client.delete(f"/v1/timeline/posts/{post_id}/reactions", headers=headers)
+        assert res.status_code == 204
+        item = feed_item()
+        assert item["likes"] == 0
+        assert item["reactions"]["thumbsUp"] == 0
+        assert item["my_reaction"] is None
+
+        res = client.post(
+            "/v1/timeline/posts/00000000-0000-0000-0000-000000000000/reactions?reaction_type=point",
+            headers=headers,
+        )
+        assert res.status_code == 404
+
+        client.delete(f"/v1/timeline/posts/{post_id}", headers=headers)
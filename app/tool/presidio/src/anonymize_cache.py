@@ -0,0 +1,150 @@
+import hashlib
+import json
+import os
+import sqlite3
+from collections import OrderedDict
+from importlib import metadata
+from typing import Callable, List, Optional
+from .anonymizer import NLP_CONFIG, OPERATORS
+
+# メモリ上に保持する件数
+DEFAULT_CACHE_SIZE = 100000
+# 実行をまたいで使い回すキャッシュファイル
+DEFAULT_CACHE_PATH = os.path.join(".cache", "anonymize.sqlite")
+
+def _version(package: str) -> str:
+    try:
+        return metadata.version(package)
+    except metadata.PackageNotFoundError:
+        return ""
+
+def config_fingerprint() -> str:
+    """匿名化の結果を左右する設定のハッシュ (変わったらキャッシュを捨てる)"""
+    config = {
+        "nlp": NLP_CONFIG,
+        "operators": {entity: [op.operator_name, op.params] for entity, op in sorted(OPERATORS.items())},
+        # モデルや認識器が更新されても結果は変わりうる
+        "versions": [_version(p) for p in ("presidio-analyzer", "presidio-anonymizer", "spacy", "ja_core_news_lg")],
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True, ensure_ascii=False).encode()).hexdigest()
+
+def _key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class AnonymizationCache:
+    """匿名化結果のキャッシュ (テキストの SHA-256 をキーにしたメモリ上の LRU + 任意の SQLite ファイル)
+
+    キャッシュファイルのキーは元のテキストのハッシュなので、短い文字列は総当たりで
+    推測できる。入力の CSV と同じ扱いで保管すること。
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_CACHE_PATH, maxsize: int = DEFAULT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.memory: "OrderedDict[str, str]" = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.db = self._open(path) if path else None
+
+    def _open(self, path: str) -> sqlite3.Connection:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        db = sqlite3.connect(path)
+        db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        db.execute("CREATE TABLE IF NOT EXISTS anonymized (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        fingerprint = config_fingerprint()
+        row = db.execute("SELECT value FROM meta WHERE name = 'fingerprint'").fetchone()
+        if row is None or row[0] != fingerprint:
+            if row is not None:
+                print("Anonymization settings changed; clearing the cache.")
+            db.execute("DELETE FROM anonymized")
+            db.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('fingerprint', ?)", (fingerprint,))
+            db.commit()
+        return db
+
+    def _remember(self, key: str, value: str):
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.maxsize:
+            self.memory.popitem(last=False)
+
+    def _load(self, keys: List[str]) -> dict:
+        found = {}
+        # SQLite の変数の上限を超えないよう分けて引く
+        for i in range(0, len(keys), 500):
+            part = keys[i:i + 500]
+            placeholders = ",".join("?" * len(part))
+            found.update(self.db.execute(
+                f"SELECT key, value FROM anonymized WHERE key IN ({placeholders})", part
+            ).fetchall())
+        return found
+
+    def apply(self, texts: List[str], anonymize: Callable[[List[str]], List[str]]) -> List[str]:
+        """キャッシュにないテキストだけ anonymize に渡し、入力順に結果を返す (同じテキストは1回だけ解析)"""
+        keys = [_key(text) if isinstance(text, str) and text else None for text in texts]
+        results = {}
+        pending = []
+        for key in dict.fromkeys(k for k in keys if k is not None):
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                results[key] = self.memory[key]
+            else:
+                pending.append(key)
+
+        from_memory = set(results)
+        if pending and self.db is not None:
+            for key, value in self._load(pending).items():
+                results[key] = value
+                self._remember(key, value)
+
+        # 出現回数で数える (同じ文章が何千回も出るのがキャッシュの狙い)。
+        # 解析するのは初出の1回だけなので、同じ入力内の重複はヒット扱い
+        first_seen = set()
+        for key in keys:
+            if key is None:
+                continue
+            if key in from_memory:
+                self.memory_hits += 1
+            elif key in results:
+                self.disk_hits += 1
+            elif key in first_seen:
+                self.memory_hits += 1
+            else:
+                first_seen.add(key)
+                self.misses += 1
+
+        missing = {key: text for key, text in zip(keys, texts) if key is not None and key not in results}
+        if missing:
+            anonymized = anonymize(list(missing.values()))
+            new_entries = list(zip(missing.keys(), anonymized))
+            for key, value in new_entries:
+                results[key] = value
+                self._remember(key, value)
+            if self.db is not None:
+                self.db.executemany("INSERT OR REPLACE INTO anonymized (key, value) VALUES (?, ?)", new_entries)
+                self.db.commit()
+
+        return [results[key] if key is not None else "" for key in keys]
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        hits = self.memory_hits + self.disk_hits
+        return {
+            "lookups": lookups,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+        }
+
+    def print_stats(self):
+        s = self.stats()
+        print(
+            f"Anonymization cache: {s['hit_rate']:.1%} hit rate "
+            f"({s['memory_hits']} memory hits, {s['disk_hits']} disk hits, {s['misses']} misses)"
+        )
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
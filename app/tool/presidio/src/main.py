@@ -3,8 +3,10 @@ import sys
 import os
 import pandas as pd
 from datetime import datetime
+from .anonymizer import DEFAULT_BATCH_SIZE
+from .anonymize_cache import DEFAULT_CACHE_PATH, DEFAULT_CACHE_SIZE, AnonymizationCache
 from .generator import generate_dummy_data
-from .processor import process_dataframe_to_csv
+from .processor import process_csv_streaming, process_dataframe_to_csv
 from .simulator import run_simulation
 
 def main():
@@ -16,6 +18,13 @@ def main():
     parser_gen.add_argument("--input", help="Input CSV file path. If omitted, generates dummy data.")
     parser_gen.add_argument("--output", help="Output CSV file path")
     parser_gen.add_argument("--dummy-count", type=int, default=500, help="Number of dummy records (default: 500)")
+    parser_gen.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help=f"Texts per spaCy batch (default: {DEFAULT_BATCH_SIZE})")
+    parser_gen.add_argument("--workers", type=int, default=1, help="Anonymization processes, each loading its own engines (default: 1)")
+    parser_gen.add_argument("--chunk-size", type=int, help="Stream --input in chunks of this many rows instead of loading it whole")
+    parser_gen.add_argument("--resume", action="store_true", help="With --chunk-size, continue from the last checkpoint of --output")
+    parser_gen.add_argument("--cache-file", default=DEFAULT_CACHE_PATH, help=f"SQLite file reused across runs (default: {DEFAULT_CACHE_PATH})")
+    parser_gen.add_argument("--no-cache-file", action="store_true", help="Keep the anonymization cache in memory only")
+    parser_gen.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE, help=f"Cached texts kept in memory (default: {DEFAULT_CACHE_SIZE})")
 
     # Command: simulate (RAG simulation)
     parser_sim = subparsers.add_parser("simulate", help="Run RAG simulation")
@@ -25,27 +34,44 @@ def main():
     args = parser.parse_args()
 
     if args.command == "generate":
-        output_file = args.output
-        if args.input:
-            if not output_file:
-                output_file = "anonymized_dataset.csv"
-            print(f"Reading from {args.input}...")
-            try:
-                df = pd.read_csv(args.input)
-                process_dataframe_to_csv(df, output_file)
-            except Exception as e:
-                print(f"Error reading CSV: {e}")
-                sys.exit(1)
-        else:
-            # Dummy mode
-            if not output_file:
-                os.makedirs("generated", exist_ok=True)
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                output_file = f"generated/{timestamp}_generated.csv"
+        # 同じ件名・説明の匿名化結果を使い回す (ファイルは実行をまたいで共有)
+        cache = AnonymizationCache(None if args.no_cache_file else args.cache_file, maxsize=args.cache_size)
+        try:
+            output_file = args.output
+            if args.input:
+                if not output_file:
+                    output_file = "anonymized_dataset.csv"
+                if args.chunk_size:
+                    print(f"Streaming from {args.input} in chunks of {args.chunk_size} rows...")
+                    try:
+                        process_csv_streaming(
+                            args.input, output_file, args.chunk_size,
+                            batch_size=args.batch_size, workers=args.workers, resume=args.resume, cache=cache,
+                        )
+                    except Exception as e:
+                        print(f"Error reading CSV: {e}")
+                        sys.exit(1)
+                    return
+                print(f"Reading from {args.input}...")
+                try:
+                    df = pd.read_csv(args.input)
+                    process_dataframe_to_csv(df, output_file, batch_size=args.batch_size, workers=args.workers, cache=cache)
+                except Exception as e:
+                    print(f"Error reading CSV: {e}")
+                    sys.exit(1)
+            else:
+                # Dummy mode
+                if not output_file:
+                    os.makedirs("generated", exist_ok=True)
+                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+                    output_file = f"generated/{timestamp}_generated.csv"
             
-            print("No input file provided. Generating dummy data...")
-            df = generate_dummy_data(args.dummy_count)
-            process_dataframe_to_csv(df, output_file)
+                print("No input file provided. Generating dummy data...")
+                df = generate_dummy_data(args.dummy_count)
+                process_dataframe_to_csv(df, output_file, batch_size=args.batch_size, workers=args.workers, cache=cache)
+        finally:
+            cache.print_stats()
+            cache.close()
 
     elif args.command == "simulate":
         if not os.path.exists(args.model_data):
@@ -1,5 +1,10 @@
+import json
+import os
+import time
+from contextlib import contextmanager
 import pandas as pd
-from .anonymizer import setup_engines, anonymize_text
+from pandas.tseries.api import guess_datetime_format
+from .anonymizer import DEFAULT_BATCH_SIZE, setup_engines, anonymize_texts, anonymize_texts_parallel, open_worker_pool
 
 def determine_category(subject: str) -> str:
     """件名からカテゴリを簡易的に判定する"""
@@ -17,92 +22,235 @@ def determine_category(subject: str) -> str:
     
     return "Private"
 
-def process_dataframe_to_csv(df: pd.DataFrame, output_file: str):
-    """DataFrameを受け取り、匿名化してフラットなCSVで出力する"""
-    
-    analyzer, anonymizer = setup_engines()
-    
-    # カラム名の正規化
+@contextmanager
+def open_text_anonymizer(batch_size: int = DEFAULT_BATCH_SIZE, workers: int = 1, cache=None):
+    """テキストのリストを匿名化する関数を返す (エンジン・ワーカーは with の間1回だけ用意する)
+
+    cache (AnonymizationCache) を渡すと、キャッシュにないテキストだけを解析する。
+    """
+    if workers > 1:
+        # エンジンは各ワーカーが読み込むので、親プロセスでは読み込まない
+        with open_worker_pool(workers) as pool:
+            run = lambda texts: anonymize_texts_parallel(texts, workers, batch_size=batch_size, pool=pool)  # noqa: E731
+            yield (lambda texts: cache.apply(texts, run)) if cache is not None else run
+    else:
+        analyzer, anonymizer = setup_engines()
+        run = lambda texts: anonymize_texts(texts, analyzer, anonymizer, batch_size=batch_size)  # noqa: E731
+        yield (lambda texts: cache.apply(texts, run)) if cache is not None else run
+
+def normalize_columns(df: pd.DataFrame):
+    """カラム名の正規化"""
     df.columns = [c.lower().strip() for c in df.columns]
+
+def find_columns(columns) -> dict:
+    """カラム検索 (ファイルごとに1回だけ行う)"""
+    columns = list(columns)
+    cols = {
+        "subject": next((c for c in columns if 'subject' in c or '件名' in c or 'title' in c), None),
+        "description": next((c for c in columns if 'description' in c or '説明' in c or 'notes' in c), None),
+        "location": next((c for c in columns if 'location' in c or '場所' in c), None),
+        "start": next((c for c in columns if 'start' in c and ('date' in c or 'time' in c) or '開始' in c), None),
+        "end": next((c for c in columns if 'end' in c and ('date' in c or 'time' in c) or '終了' in c), None),
+    }
+    # 日付と時刻が別カラムの場合 (Start Date + Start Time など) の時刻カラム
+    for key in ("start", "end"):
+        date_col = cols[key]
+        cols[f"{key}_time"] = None
+        if date_col and 'time' not in date_col:
+            cols[f"{key}_time"] = next((c for c in columns if key in c and 'time' in c), None)
+    return cols
+
+def combine_date_time(df: pd.DataFrame, date_col: str, time_col) -> pd.Series:
+    """日付カラムと時刻カラムを "日付 時刻" の文字列にまとめる"""
+    values = df[date_col].astype("string")
+    if time_col:
+        times = df[time_col].astype("string")
+        values = values.where(times.isna(), values + " " + times)
+    return values
+
+def parse_datetimes(values: pd.Series) -> pd.Series:
+    """文字列の列を日時に変換する (解析できない行は NaT)"""
+    sample = values.dropna()
+    parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    if sample.empty:
+        return parsed
+    # 先頭の値から書式を推定して列全体を一括変換する
+    fmt = guess_datetime_format(sample.iloc[0])
+    if fmt:
+        parsed = pd.to_datetime(values, format=fmt, errors="coerce")
+    # 書式の違う行だけ1件ずつ解析し直す
+    retry = parsed.isna() & values.notna()
+    if retry.any():
+        parsed[retry] = pd.to_datetime(values[retry], format="mixed", errors="coerce")
+    return parsed
+
+def build_records(df: pd.DataFrame, cols: dict, anonymize) -> pd.DataFrame:
+    """正規化済みの DataFrame から匿名化・特徴量抽出した DataFrame を作る"""
+    subject_col, desc_col, loc_col = cols["subject"], cols["description"], cols["location"]
+
+    # 件名と説明は列ごとにまとめて匿名化する (spaCy をバッチで回す)
+    subjects = [str(v) if pd.notna(v) else "" for v in df[subject_col]]
+    descriptions = [str(v) if pd.notna(v) else "" for v in df[desc_col]] if desc_col else [""] * len(df)
+    anonymized = anonymize(subjects + descriptions)
+    anon_subjects, anon_descriptions = anonymized[:len(df)], anonymized[len(df):]
+
+    # 日時と特徴量は列単位で計算する
+    start_dt = parse_datetimes(combine_date_time(df, cols["start"], cols["start_time"]))
+    if cols["end"]:
+        end_values = combine_date_time(df, cols["end"], cols["end_time"])
+        if cols["end_time"]:
+            # 終了日が空で終了時刻だけある行は開始日の日付と組み合わせる
+            end_times = df[cols["end_time"]].astype("string")
+            only_time = df[cols["end"]].isna() & end_times.notna()
+            end_values = end_values.mask(only_time, start_dt.dt.strftime("%Y-%m-%d").astype("string") + " " + end_times)
+        end_dt = parse_datetimes(end_values)
+        # 終了日時が空の行は開始日時と同じ、解析できない行はその行全体を無効にする
+        end_failed = end_values.notna() & end_dt.isna()
+        end_dt = end_dt.where(end_values.notna(), start_dt)
+    else:
+        end_failed = pd.Series(False, index=df.index)
+        end_dt = start_dt
+    failed = start_dt.isna() | end_failed
+    start_dt = start_dt.mask(failed)
+    end_dt = end_dt.mask(failed)
+
+    weekday = start_dt.dt.weekday.astype("Int64")
+    if loc_col:
+        locations = df[loc_col].astype("string").str.strip()
+        anon_locations = locations.notna() & (locations != "")
+    else:
+        anon_locations = pd.Series(False, index=df.index)
+
+    return pd.DataFrame({
+        "start": start_dt.dt.strftime("%Y-%m-%dT%H:%M:%S"),
+        "end": end_dt.dt.strftime("%Y-%m-%dT%H:%M:%S"),
+        "duration_minutes": ((end_dt - start_dt).dt.total_seconds() / 60).fillna(0),
+        "weekday": weekday,
+        "hour": start_dt.dt.hour.astype("Int64"),
+        "month": start_dt.dt.month.astype("Int64"),
+        "day": start_dt.dt.day.astype("Int64"),
+        "is_weekend": (weekday >= 5).fillna(False).astype(int),
+        "category": [determine_category(subject) for subject in subjects],
+        "original_subject_length": [len(subject) for subject in subjects],
+        "subject": anon_subjects,
+        "description": anon_descriptions,
+        "location": anon_locations.map({True: "<LOCATION>", False: ""}),
+    }, index=df.index).reset_index(drop=True)
+
+def process_dataframe_to_csv(df: pd.DataFrame, output_file: str, batch_size: int = DEFAULT_BATCH_SIZE, workers: int = 1, cache=None):
+    """DataFrameを受け取り、匿名化してフラットなCSVで出力する"""
     
-    # カラム検索
-    subject_col = next((c for c in df.columns if 'subject' in c or '件名' in c or 'title' in c), None)
-    desc_col = next((c for c in df.columns if 'description' in c or '説明' in c or 'notes' in c), None)
-    loc_col = next((c for c in df.columns if 'location' in c or '場所' in c), None)
-    start_col = next((c for c in df.columns if 'start' in c and ('date' in c or 'time' in c) or '開始' in c), None)
-    end_col = next((c for c in df.columns if 'end' in c and ('date' in c or 'time' in c) or '終了' in c), None)
-
-    if not subject_col or not start_col:
+    normalize_columns(df)
+    cols = find_columns(df.columns)
+
+    if not cols["subject"] or not cols["start"]:
         print("Error: Could not identify 'Subject' or 'Start Date' columns.")
         return
 
     print(f"Processing {len(df)} records for anonymization and feature extraction...")
-    
-    processed_records = []
-    
-    for index, row in df.iterrows():
-        original_subject = str(row[subject_col]) if pd.notna(row[subject_col]) else ""
-        description = str(row[desc_col]) if desc_col and pd.notna(row[desc_col]) else ""
-        location = str(row[loc_col]) if loc_col and pd.notna(row[loc_col]) else ""
-        
-        category = determine_category(original_subject)
-        anon_subject = anonymize_text(original_subject, analyzer, anonymizer)
-        anon_description = anonymize_text(description, analyzer, anonymizer)
-        anon_location = "<LOCATION>" if location.strip() else ""
-
-        try:
-            start_str = str(row[start_col])
-            if 'time' not in start_col.lower():
-                start_time_col = next((c for c in df.columns if 'start' in c and 'time' in c), None)
-                if start_time_col and pd.notna(row[start_time_col]):
-                    start_str += f" {row[start_time_col]}"
-            
-            start_dt = pd.to_datetime(start_str)
-
-            end_str = str(row[end_col]) if end_col and pd.notna(row[end_col]) else str(start_dt)
-            if end_col and 'time' not in end_col.lower():
-                end_time_col = next((c for c in df.columns if 'end' in c and 'time' in c), None)
-                if end_time_col and pd.notna(row[end_time_col]):
-                    end_str += f" {row[end_time_col]}"
-            
-            end_dt = pd.to_datetime(end_str) if end_col else start_dt
-
-            duration = (end_dt - start_dt).total_seconds() / 60
-            
-            weekday = start_dt.weekday()
-            hour = start_dt.hour
-            month = start_dt.month
-            day = start_dt.day
-            is_weekend = True if weekday >= 5 else False
-
-        except Exception:
-            start_dt = None
-            end_dt = None
-            duration = 0
-            weekday = None
-            hour = None
-            month = None
-            day = None
-            is_weekend = False
-
-        record = {
-            "start": start_dt.isoformat() if start_dt else None,
-            "end": end_dt.isoformat() if end_dt else None,
-            "duration_minutes": duration,
-            "weekday": weekday,
-            "hour": hour,
-            "month": month,
-            "day": day,
-            "is_weekend": 1 if is_weekend else 0,
-            "category": category,
-            "original_subject_length": len(original_subject),
-            "subject": anon_subject,
-            "description": anon_description,
-            "location": anon_location
-        }
-        processed_records.append(record)
 
-    output_df = pd.DataFrame(processed_records)
+    with open_text_anonymizer(batch_size, workers, cache) as anonymize:
+        output_df = build_records(df, cols, anonymize)
     print(f"Writing to {output_file}...")
     output_df.to_csv(output_file, index=False, encoding='utf-8')
     print("Done.")
+
+def _checkpoint_path(output_file: str) -> str:
+    return output_file + ".checkpoint"
+
+def _input_stat(input_file: str) -> dict:
+    """入力ファイルのサイズと更新時刻 (書き換えられていたら再開しない)"""
+    stat = os.stat(input_file)
+    return {"input_size": stat.st_size, "input_mtime_ns": stat.st_mtime_ns}
+
+def _load_checkpoint(input_file: str, output_file: str, chunk_size: int):
+    """同じ入力・チャンクサイズで途中まで書かれた出力があればそのチェックポイントを返す"""
+    path = _checkpoint_path(output_file)
+    if not os.path.exists(path) or not os.path.exists(output_file):
+        return None
+    with open(path, encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    if checkpoint["input"] != os.path.abspath(input_file) or checkpoint["chunk_size"] != chunk_size:
+        print("Checkpoint was written for another input or chunk size; starting over.")
+        return None
+    # 同じパスでも中身が変わっていればチャンクの境界がずれる
+    if any(checkpoint.get(key) != value for key, value in _input_stat(input_file).items()):
+        print("Input file changed since the checkpoint was written; starting over.")
+        return None
+    return checkpoint
+
+def _save_checkpoint(output_file: str, checkpoint: dict):
+    # 書きかけのチェックポイントが残らないよう、一時ファイルから置き換える
+    path = _checkpoint_path(output_file)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+    os.replace(path + ".tmp", path)
+
+def process_csv_streaming(
+    input_file: str,
+    output_file: str,
+    chunk_size: int,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    workers: int = 1,
+    resume: bool = False,
+    cache=None,
+):
+    """入力CSVをチャンクごとに匿名化して出力CSVに追記する (メモリ使用量はチャンクサイズで決まる)
+
+    チャンクを書き終えるたびに <output>.checkpoint を更新し、resume=True なら
+    最後に書き終えたチャンクの次から再開する。
+    """
+    checkpoint = _load_checkpoint(input_file, output_file, chunk_size) if resume else None
+    if checkpoint:
+        # 最後のチャンクの途中まで書かれた行を捨てる
+        with open(output_file, "r+b") as out:
+            out.truncate(checkpoint["output_bytes"])
+        print(f"Resuming after {checkpoint['rows_done']} rows ({checkpoint['chunks_done']} chunks)...")
+    else:
+        checkpoint = {
+            "input": os.path.abspath(input_file),
+            **_input_stat(input_file),
+            "chunk_size": chunk_size,
+            "chunks_done": 0,
+            "rows_done": 0,
+            "output_bytes": 0,
+        }
+        if os.path.exists(output_file):
+            os.remove(output_file)
+
+    total_bytes = os.path.getsize(input_file)
+    started = time.perf_counter()
+    rows_this_run = 0
+    cols = None
+
+    with open(input_file, "rb") as source, open_text_anonymizer(batch_size, workers, cache) as anonymize:
+        for chunk_index, chunk in enumerate(pd.read_csv(source, chunksize=chunk_size)):
+            normalize_columns(chunk)
+            if cols is None:
+                cols = find_columns(chunk.columns)
+                if not cols["subject"] or not cols["start"]:
+                    print("Error: Could not identify 'Subject' or 'Start Date' columns.")
+                    return
+            # 再開時、書き終えたチャンクは読み飛ばすだけ (NLP は通さない)
+            if chunk_index < checkpoint["chunks_done"]:
+                continue
+
+            output_df = build_records(chunk, cols, anonymize)
+            with open(output_file, "a", encoding="utf-8", newline="") as out:
+                output_df.to_csv(out, index=False, header=checkpoint["output_bytes"] == 0)
+                out.flush()
+                os.fsync(out.fileno())
+                checkpoint["output_bytes"] = os.fstat(out.fileno()).st_size
+            checkpoint["chunks_done"] = chunk_index + 1
+            checkpoint["rows_done"] += len(chunk)
+            _save_checkpoint(output_file, checkpoint)
+
+            rows_this_run += len(chunk)
+            elapsed = time.perf_counter() - started
+            # pandas は先読みするので位置はおおよそ
+            percent = min(100.0, source.tell() / total_bytes * 100) if total_bytes else 100.0
+            print(f"  {checkpoint['rows_done']} rows written (~{percent:.0f}% of input, {rows_this_run / elapsed:.1f} rows/s)")
+
+    if os.path.exists(_checkpoint_path(output_file)):
+        os.remove(_checkpoint_path(output_file))
+    print(f"Done. Wrote {checkpoint['rows_done']} rows to {output_file}.")
@@ -0,0 +1,113 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import pandas as pd
+
+from src.processor import (
+    _input_stat, _load_checkpoint, _save_checkpoint, build_records, determine_category, find_columns, normalize_columns,
+)
+
+
+def per_row_records(df: pd.DataFrame, cols: dict, anonymize) -> pd.DataFrame:
+    """以前の1行ずつの実装 (比較用)"""
+    subject_col, desc_col, loc_col = cols["subject"], cols["description"], cols["location"]
+    start_col, end_col = cols["start"], cols["end"]
+    subjects = [str(v) if pd.notna(v) else "" for v in df[subject_col]]
+    descriptions = [str(v) if pd.notna(v) else "" for v in df[desc_col]] if desc_col else [""] * len(df)
+    anonymized = anonymize(subjects + descriptions)
+    records = []
+    for position, (_, row) in enumerate(df.iterrows()):
+        location = str(row[loc_col]) if loc_col and pd.notna(row[loc_col]) else ""
+        try:
+            start_str = str(row[start_col])
+            if 'time' not in start_col.lower():
+                start_time_col = next((c for c in df.columns if 'start' in c and 'time' in c), None)
+                if start_time_col and pd.notna(row[start_time_col]):
+                    start_str += f" {row[start_time_col]}"
+            start_dt = pd.to_datetime(start_str)
+            end_str = str(row[end_col]) if end_col and pd.notna(row[end_col]) else str(start_dt)
+            if end_col and 'time' not in end_col.lower():
+                end_time_col = next((c for c in df.columns if 'end' in c and 'time' in c), None)
+                if end_time_col and pd.notna(row[end_time_col]):
+                    end_str += f" {row[end_time_col]}"
+            end_dt = pd.to_datetime(end_str) if end_col else start_dt
+            duration = (end_dt - start_dt).total_seconds() / 60
+            weekday, hour, month, day = start_dt.weekday(), start_dt.hour, start_dt.month, start_dt.day
+        except Exception:
+            start_dt = end_dt = weekday = hour = month = day = None
+            duration = 0
+        records.append({
+            "start": start_dt.isoformat() if start_dt else None,
+            "end": end_dt.isoformat() if end_dt else None,
+            "duration_minutes": duration,
+            "weekday": weekday,
+            "hour": hour,
+            "month": month,
+            "day": day,
+            "is_weekend": 1 if weekday is not None and weekday >= 5 else 0,
+            "category": determine_category(subjects[position]),
+            "original_subject_length": len(subjects[position]),
+            "subject": anonymized[position],
+            "description": anonymized[len(df) + position],
+            "location": "<LOCATION>" if location.strip() else "",
+        })
+    return pd.DataFrame(records)
+
+
+def as_values(df: pd.DataFrame) -> list:
+    # 欠損の表し方 (None / NaN / NA) と int・float の違いは比べない
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def check_same_as_per_row(df: pd.DataFrame):
+    normalize_columns(df)
+    cols = find_columns(df.columns)
+    anonymize = lambda texts: [text.upper() for text in texts]  # noqa: E731
+    assert as_values(build_records(df, cols, anonymize)) == as_values(per_row_records(df, cols, anonymize))
+
+
+def test_separate_date_and_time_columns():
+    check_same_as_per_row(pd.DataFrame({
+        "Subject": ["定例会議", "ランチ", None, "ジム", "面談", "資料作成", "飲み会"],
+        "Start Date": ["2025-03-01", "2025-03-02", "2025-03-03", "not a date", "2025/03/05", "2025-03-06", "2025-03-08"],
+        "Start Time": ["10:00", "11:30", None, "09:00", "14:00", "09:15", "19:00"],
+        # 終了日が空で終了時刻だけある行は開始日と組み合わせる
+        "End Date": [None, "2025-03-02", None, None, "2025-03-05", "garbage", "2025-03-09"],
+        "End Time": ["12:00", None, None, "10:00", "15:30", "10:00", "01:00"],
+        "Description": ["田中さんと打ち合わせ", None, "", "x", "y", "z", "w"],
+        "Location": ["本社", " ", None, "渋谷", "", "大阪", "新宿"],
+    }))
+
+
+def test_combined_datetime_columns():
+    check_same_as_per_row(pd.DataFrame({
+        "Title": ["会議", "ご飯", "病院", "散歩"],
+        "Start Time": ["2025-03-01 10:00:00", "2025-03-02 12:00:00", "bad", "2025-03-04 08:00:00"],
+        "End Time": ["2025-03-01 11:00:00", None, "2025-03-03 10:00:00", "2025-03-04 08:45:00"],
+    }))
+
+
+def test_start_only():
+    check_same_as_per_row(pd.DataFrame({
+        "件名": ["会議", "ランチ"],
+        "開始": ["2025-03-01 10:00", "2025-03-02 12:30"],
+    }))
+
+
+def test_checkpoint_refused_after_input_changes(tmp_path):
+    input_file, output_file = tmp_path / "in.csv", tmp_path / "out.csv"
+    input_file.write_text("Subject,Start Date\n会議,2025-03-01\n", encoding="utf-8")
+    output_file.write_text("start\n", encoding="utf-8")
+    _save_checkpoint(str(output_file), {
+        "input": os.path.abspath(input_file),
+        **_input_stat(str(input_file)),
+        "chunk_size": 1,
+        "chunks_done": 1,
+        "rows_done": 1,
+        "output_bytes": 6,
+    })
+    assert _load_checkpoint(str(input_file), str(output_file), 1)["rows_done"] == 1
+
+    # 同じパスに別の内容 (サイズが変わる) を書き込むと再開しない
+    input_file.write_text("Subject,Start Date\nランチ,2025-03-02\n", encoding="utf-8")
+    assert _load_checkpoint(str(input_file), str(output_file), 1) is None